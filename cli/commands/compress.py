@@ -4,6 +4,7 @@ Usage: python -m cli.commands.compress input.pdf -o output.zpkg
 """
 import argparse
 import sys
+import time
 from pathlib import Path
 from core.utils.logger import logger
 
@@ -31,9 +32,22 @@ def main():
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
+    # Repaint only when the whole percent changes or 200ms have passed —
+    # each paint is a terminal write + flush
+    progress_state = {'last_pct': -1, 'last_t': 0.0}
+
     def on_progress(bytes_done, total):
         if total < 10 * 1024 * 1024:
             return
+        pct = int(bytes_done * 100 / total)
+        now = time.monotonic()
+        if (pct == progress_state['last_pct']
+                and now - progress_state['last_t'] < 0.2
+                and bytes_done != total):
+            return
+        progress_state['last_pct'] = pct
+        progress_state['last_t'] = now
+
         percent = bytes_done / total * 100
         filled = int(percent / 2)
         bar = '█' * filled + '░' * (50 - filled)
@@ -5,11 +5,11 @@ Usage: python -m zypher_cli.commands.decompress input.zpkg -o output_folder
 
 import argparse
 import sys
-import os
 import shutil
 from pathlib import Path
 from core.unpacker.unpacker import Unpacker
 from core.utils.logger import logger
+from cli.utils import nonempty
 
 def main():
     parser = argparse.ArgumentParser(description="Decompress a Zypher archive and rebuild the original file")
@@ -61,7 +61,7 @@ def main():
     except Exception as e:
         logger.error(f"Fatal error: {e}")
         # Clean up failed directory
-        if out_dir.exists() and not any(out_dir.iterdir()):
+        if out_dir.exists() and not nonempty(out_dir):
             out_dir.rmdir()
         sys.exit(1)
 
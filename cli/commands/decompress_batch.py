@@ -7,6 +7,7 @@ import sys
 from pathlib import Path
 from core.unpacker.batch_unpacker import BatchUnpacker
 from core.utils.logger import logger
+from cli.utils import nonempty
 
 
 def main():
@@ -32,7 +33,7 @@ def main():
         else input_dir.parent / (input_dir.name + '_restored')
     )
 
-    if output_dir.exists() and any(output_dir.iterdir()) and not args.force:
+    if nonempty(output_dir) and not args.force:
         logger.error(f"Output directory is not empty: {output_dir}")
         print("Use -f or --force to overwrite existing files.")
         sys.exit(1)
@@ -0,0 +1,61 @@
+"""
+Zypher CLI - Train Dictionary Command
+Usage: python -m cli.commands.train_dict samples/*.pdf --layout
+"""
+import argparse
+import sys
+from pathlib import Path
+from core.utils.logger import logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a zstd dictionary offline from sample files")
+    parser.add_argument("samples", nargs='+', help="Sample files (or directories) to train on")
+    parser.add_argument("-o", "--output", help="Dictionary output path (default: configured dictionary path)")
+    parser.add_argument("-s", "--size-kb", type=int, default=None,
+                        help="Dictionary size in KB (default: from config)")
+    parser.add_argument("--layout", action='store_true',
+                        help="Train the layout dictionary on PDF page layouts instead of the package dictionary")
+
+    args = parser.parse_args()
+
+    sample_files = []
+    for sample in map(Path, args.samples):
+        if sample.is_dir():
+            sample_files.extend(str(p) for p in sorted(sample.rglob('*')) if p.is_file())
+        elif sample.is_file():
+            sample_files.append(str(sample))
+        else:
+            logger.warning(f"Sample not found: {sample}")
+
+    if args.layout:
+        sample_files = [f for f in sample_files if f.lower().endswith('.pdf')]
+
+    if not sample_files:
+        logger.error("No sample files to train on")
+        sys.exit(1)
+
+    try:
+        if args.layout:
+            from core.compressor.metadata_compressor import MetadataCompressor
+            output_path = MetadataCompressor().train_dictionary(
+                sample_files, dict_output_path=args.output, dict_size_kb=args.size_kb
+            )
+        else:
+            from core.config import config
+            from core.packager.packager import Packager
+            output_path = Packager().train_dictionary(
+                sample_files, dict_output_path=args.output, dict_size_kb=args.size_kb or config.dict_size_kb
+            )
+        print(f"\n✅ Dictionary saved to: {output_path}")
+
+    except KeyboardInterrupt:
+        print("\nOperation cancelled by user.")
+        sys.exit(130)
+    except Exception as e:
+        logger.error(f"Fatal error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
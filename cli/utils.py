@@ -0,0 +1,17 @@
+"""
+Zypher CLI - Shared helpers for the command modules.
+"""
+import os
+from pathlib import Path
+
+
+def nonempty(path: Path) -> bool:
+    """True if the directory has at least one entry — stops at the first."""
+    try:
+        with os.scandir(path) as it:
+            return next(it, None) is not None
+    except FileNotFoundError:
+        return False
+
+
+__all__ = ["nonempty"]
@@ -6,26 +6,88 @@ Optimizes images based on content:
 """
 
 import io
+import os
+import shutil
+import tempfile
+import threading
+from multiprocessing.util import Finalize
 from PIL import Image
 from ..utils.logger import logger
 
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    import glymur
+    HAS_GLYMUR = True
+except Exception:
+    HAS_GLYMUR = False
+
+# glymur only writes to a path; encodes share one scratch directory per
+# process, created on first use, instead of a fresh temp file per image
+_jp2_tmp_dir = None
+_jp2_tmp_pid = None
+_jp2_tmp_lock = threading.Lock()
+
+
+def _jp2_scratch_path() -> str:
+    """This thread's scratch file for glymur encodes."""
+    global _jp2_tmp_dir, _jp2_tmp_pid
+    with _jp2_tmp_lock:
+        # A forked pool worker makes its own rather than sharing the parent's
+        if _jp2_tmp_pid != os.getpid():
+            _jp2_tmp_dir = tempfile.mkdtemp(prefix='zypher-jp2-')
+            _jp2_tmp_pid = os.getpid()
+            # Finalize (unlike atexit) also runs when a pool worker exits
+            Finalize(None, shutil.rmtree, args=(_jp2_tmp_dir, True), exitpriority=0)
+    return os.path.join(_jp2_tmp_dir, f"{threading.get_ident()}.jp2")
+
+# Grayscale -> 1-bit threshold table (p > 127 is white)
+_BW_THRESHOLD_LUT = [255 if p > 127 else 0 for p in range(256)]
+
+# Sources already in a transform/bilevel codec (JPEG, JPEG 2000, JBIG2) are
+# stored as-is: transcoding them decodes and re-encodes at full CPU cost and
+# rarely comes out smaller
+_PASSTHROUGH_EXTS = {'jpg', 'jpeg', 'jp2', 'jpx', 'j2k', 'jb2', 'jbig2'}
+_PASSTHROUGH_SIGNATURES = (
+    b'\xff\xd8\xff',                    # JPEG
+    b'\x00\x00\x00\x0cjP  \r\n\x87\n',  # JP2 container
+    b'\xff\x4f\xff\x51',                # raw JPEG 2000 codestream
+    b'\x97JB2\r\n\x1a\n',               # JBIG2 file
+)
+
 class ImageCompressor:
+    # Above this pixel count the B&W check runs on a 1/4-scale sample —
+    # the 90% threshold is statistical and doesn't need full resolution
+    MONO_SAMPLE_PIXELS = 4_000_000
+
     def __init__(self, compression_level: str = 'high'):
         # Map generic levels to format-specific quality
         # 40dB is roughly visually lossless for JP2
         self.jp2_quality_layers = [80] if compression_level == 'high' else [40]
 
-    def compress(self, image_data: bytes) -> bytes:
+    def compress(self, image_data: bytes, ext: str = None) -> bytes:
         """
         Smartly compresses image data based on visual content.
-        Returns the compressed bytes in the optimal format (TIFF-G4 or JP2).
+        Returns the compressed bytes in the optimal format (TIFF-G4 or JP2),
+        or the input unchanged when it is already JPEG/JP2/JBIG2 (see is_passthrough).
         """
+        if self.is_passthrough(image_data, ext):
+            return image_data
+
         try:
-            # We open the bytes without fully decoding to pixels immediately if possible,
-            # but for analysis, we need the pixel data.
+            # Decode once up front; the analysis, the grayscale derivation and
+            # the encoders below all reuse these pixels instead of re-reading
+            # the source stream.
             with Image.open(io.BytesIO(image_data)) as img:
+                img.load()
                 
                 # 1. Analyze: Is this a Black & White Scan?
+                # The check works on a sample; full-resolution thresholding
+                # only happens in the 1-bit encode once the answer is yes
                 if self._is_monochrome_scan(img):
                     return self._compress_ccitt_g4(img)
                 
@@ -36,6 +98,13 @@ class ImageCompressor:
             logger.warning(f"Smart compression failed: {e}. Storing original.")
             return image_data
 
+    @staticmethod
+    def is_passthrough(image_data: bytes, ext: str = None) -> bool:
+        """True if the image is already in a codec compress() would not improve on."""
+        if ext and ext.lower().lstrip('.') in _PASSTHROUGH_EXTS:
+            return True
+        return image_data.startswith(_PASSTHROUGH_SIGNATURES)
+
     def _is_monochrome_scan(self, img: Image.Image) -> bool:
         """
         Detects if an image is effectively black and white text.
@@ -45,25 +114,43 @@ class ImageCompressor:
         if img.mode == '1':
             return True
             
-        # Convert to grayscale to check histogram
-        # This is a fast operation
-        gray = img.convert("L")
-        histogram = gray.histogram()
-        
         # Heuristic: Scanned text usually has pixels clustered at 0 (black) and 255 (white)
         # We check if > 90% of pixels exist at the very edges of the spectrum.
         total_pixels = img.width * img.height
         if total_pixels == 0: return False
+
+        if total_pixels > self.MONO_SAMPLE_PIXELS:
+            # Sample before converting so the grayscale pass only touches 1/16
+            # of the pixels. NEAREST keeps source values; a box reduce would
+            # blur glyph edges into mid-grays and skew the count
+            img = img.resize((max(1, img.width // 4), max(1, img.height // 4)), Image.NEAREST)
+
+        # Skip the conversion pass when the image is already grayscale
+        gray = img if img.mode == 'L' else img.convert("L")
+
+        if HAS_NUMPY:
+            # Single vectorized pass over the raw buffer instead of PIL's histogram
+            arr = np.frombuffer(gray.tobytes(), dtype=np.uint8)
+            black_white_pixels = int(np.count_nonzero((arr < 15) | (arr >= 241)))
+            return (black_white_pixels / arr.size) > 0.90
+
+        histogram = gray.histogram()
         
-        # Sum pixels at the dark end (0-10) and bright end (245-255)
+        # Sum pixels at the dark end (0-14) and bright end (241-255)
         black_white_pixels = sum(histogram[:15]) + sum(histogram[-15:])
         
-        return (black_white_pixels / total_pixels) > 0.90
+        return (black_white_pixels / (gray.width * gray.height)) > 0.90
 
     def _compress_ccitt_g4(self, img: Image.Image) -> bytes:
         """Compresses as 1-bit TIFF using CCITT Group 4 (Lossless, Tiny for Text)"""
-        # Convert to 1-bit bitmap (dithering off for text clarity)
-        bw = img.convert("1", dither=Image.NONE)
+        # Threshold to 1-bit (dithering off for text clarity). From grayscale
+        # this is a single LUT pass — same cut-off as convert("1", dither=NONE)
+        if img.mode == '1':
+            bw = img
+        elif img.mode == 'L':
+            bw = img.point(_BW_THRESHOLD_LUT, mode='1')
+        else:
+            bw = img.convert("1", dither=Image.NONE)
         
         out = io.BytesIO()
         # 'group4' is the specific compression algorithm used by Fax machines
@@ -79,15 +166,41 @@ class ImageCompressor:
             if img.mode == 'P':
                 img = img.convert('RGBA')
             
+            if HAS_GLYMUR and HAS_NUMPY and img.mode in ('L', 'RGB', 'RGBA'):
+                data = self._encode_jp2_glymur(img)
+                if data:
+                    return data
+            
             # Save as JP2
             img.save(out, format="JPEG2000", quality_mode='dB', quality_layers=self.jp2_quality_layers)
             return out.getvalue()
         except Exception:
             # Fallback to Optimized standard JPEG if system lacks JP2 drivers
-            out.seek(0)
-            out.truncate()
+            out = io.BytesIO()
             # Convert to RGB because standard JPEG doesn't support Alpha
             img.convert('RGB').save(out, format="JPEG", optimize=True, quality=85)
             return out.getvalue()
 
+    def _encode_jp2_glymur(self, img: Image.Image) -> bytes:
+        """
+        JP2 encode through glymur/openjp2, which runs the wavelet stage
+        multi-threaded. Returns b'' on failure so the caller uses PIL.
+        """
+        tmp_path = _jp2_scratch_path()
+        prev_threads = None
+        try:
+            # Let openjp2 encode tiles on every core (needs openjpeg >= 2.4),
+            # scoped to this encode rather than set process-wide at import
+            prev_threads = glymur.get_option('lib.num_threads')
+            glymur.set_option('lib.num_threads', os.cpu_count() or 1)
+            glymur.Jp2k(tmp_path, data=np.asarray(img), psnr=self.jp2_quality_layers)
+            with open(tmp_path, 'rb') as f:
+                return f.read()
+        except Exception as e:
+            logger.debug(f"glymur JP2 encode failed, using PIL: {e}")
+            return b''
+        finally:
+            if prev_threads is not None:
+                glymur.set_option('lib.num_threads', prev_threads)
+
 __all__ = ["ImageCompressor"]
\ No newline at end of file
@@ -6,34 +6,196 @@ Groups words into lines to prevent text overlap in rebuilt PDFs.
 FIX: Words must be grouped into lines sharing the same Y-coordinate,
      otherwise every word draws at its own position causing overlap.
 """
+import io
+import os
 import json
 import zstandard as zstd
-from typing import Dict, Union, Any, List
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import BinaryIO, Dict, Union, Any, Iterator, List, NamedTuple, Optional, Tuple
+from ..config import config
+from ..utils.zstd_contexts import get_compressor, get_decompressor
 from ..utils.logger import logger
+from ..utils.text import strip_nonprintable
 
 # Conditional imports
-try:
-    import pdfplumber
-    HAS_PLUMBER = True
-except ImportError:
-    HAS_PLUMBER = False
-    logger.warning("pdfplumber not installed - layout extraction disabled")
-
 try:
     import fitz  # PyMuPDF
     HAS_FITZ = True
 except ImportError:
     HAS_FITZ = False
-    logger.warning("PyMuPDF not installed - text correction disabled")
+    logger.warning("PyMuPDF not installed - layout extraction disabled")
+
+# Layout comes from MuPDF's own span extraction; pdfminer (under pdfplumber)
+# is slow to import and to parse, so it's only loaded when fitz is missing.
+# Skipping it also keeps process-pool worker start-up cheap.
+HAS_PLUMBER = False
+if not HAS_FITZ:
+    try:
+        import pdfplumber
+        HAS_PLUMBER = True
+    except ImportError:
+        pass
+
+try:
+    import numpy as np
+    from scipy.spatial import cKDTree
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+# TeX Computer Modern font prefixes (Type1 without Unicode mapping)
+_TEX_FONT_PREFIXES = ('cmr', 'cmmi', 'cmsy', 'cmex', 'cmbx', 'cmtt', 'cmsl', 'cmti')
+
+class _Span(NamedTuple):
+    """One text span during extraction — a tuple, so no per-span dict overhead."""
+    text: str
+    x: int     # pt * COORD_SCALE
+    y: int     # pt * COORD_SCALE
+    font: str
+    size: int  # pt * SIZE_SCALE
+    flags: int
+
+_SPAN_FIELDS = _Span._fields
+
+# Fixed-point storage: 0.01pt positions and 0.1pt sizes as ints serialize
+# shorter than floats and give zstd repeatable byte patterns
+COORD_SCALE = 100
+SIZE_SCALE = 10
+
+if HAS_FITZ:
+    # No TEXT_PRESERVE_IMAGES: image blocks are never built. MEDIABOX_CLIP drops
+    # off-page glyphs in MuPDF before they become Python span dicts.
+    _FITZ_FLAGS = (
+        fitz.TEXT_PRESERVE_LIGATURES
+        | fitz.TEXT_PRESERVE_WHITESPACE
+        | fitz.TEXT_MEDIABOX_CLIP
+    )
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _json_default(obj: Any) -> str:
+    # Raw binary (e.g. font programs) is hex-encoded only at JSON emit time;
+    # msgpack carries it natively
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).hex()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_dumps(data: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes (orjson when available)."""
+    if HAS_ORJSON:
+        return orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=_json_default).encode('utf-8')
+
+
+def _json_loads(raw: bytes) -> Any:
+    if HAS_ORJSON:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+# MessagePack payloads are prefixed with this format tag. 0xC1 is the one byte
+# msgpack never emits and is not valid UTF-8, so no JSON document (legacy
+# archives included, whatever their top-level type) can start with it.
+# Untagged payloads are JSON.
+_MSGPACK_TAG = b'\xc1'
 
 
 class MetadataCompressor:
-    def __init__(self):
-        self.compressor = zstd.ZstdCompressor(level=22)
-        self.decompressor = zstd.ZstdDecompressor()
+    # Below this, process-pool spawn costs more than it saves
+    PARALLEL_PAGE_THRESHOLD = 8
+    # Max center distance (pt) for a fitz span to replace a plumber word
+    MATCH_RADIUS = 50
+    # Payloads under this are compressed at SMALL_PAYLOAD_LEVEL: for a few KB
+    # the higher levels' extra search finds almost nothing the dictionary hasn't
+    SMALL_PAYLOAD_SIZE = 4096
+    SMALL_PAYLOAD_LEVEL = 3
+    # zstd worker threads only pay off once a payload spans several jobs
+    THREADED_PAYLOAD_SIZE = 1 << 20
+
+    def __init__(self, legacy_json: bool = False, level: Optional[int] = None, dict_path: str = None):
+        # msgpack stores floats/ints fixed-width instead of as ASCII digits;
+        # legacy_json keeps writing the old JSON payload
+        self.use_msgpack = HAS_MSGPACK and not legacy_json
+        self.level = level if level is not None else config.zstd_level
+
+        # Layout blobs share one schema and a handful of font names — a trained
+        # dictionary covers that shared part even for single-page documents
+        self.dict_path = Path(dict_path) if dict_path else config.layout_dict_path
+        self._dict = None
+        self._load_dictionary()
+
+    def _load_dictionary(self):
+        if self.dict_path.exists():
+            try:
+                self._dict = zstd.ZstdCompressionDict(self.dict_path.read_bytes())
+                logger.info(f"Loaded layout dictionary ({len(self._dict.as_bytes())/1024:.1f} KB)")
+            except Exception as e:
+                logger.warning(f"Failed to load layout dictionary: {e}")
+
+    @property
+    def compressor(self) -> zstd.ZstdCompressor:
+        return self._compressor_for(self.level)
+
+    def _compressor_for(self, level: int, threads: int = -1) -> zstd.ZstdCompressor:
+        # Balanced level + long-range matching: layout data repeats font ids and
+        # coordinates across pages, LDM catches that at a fraction of level 22's cost
+        return get_compressor(level, window_log=27, enable_ldm=True, dict_data=self._dict, threads=threads)
+
+    @property
+    def decompressor(self) -> zstd.ZstdDecompressor:
+        return get_decompressor(self._dict)
+
+    def train_dictionary(self, sample_files: list, dict_output_path: str = None, dict_size_kb: int = None) -> str:
+        """
+        Train a zstd dictionary on the page layouts of sample PDFs.
+        Each page is one training sample, serialized exactly as compress() does.
+        """
+        if not sample_files:
+            raise ValueError("No sample files provided for training")
+
+        output_path = dict_output_path or str(self.dict_path)
+        samples = []
+        for file_path in sample_files:
+            layout = self.extract_layout(file_path)
+            for page_layout in layout.get('pages', {}).values():
+                samples.append(self._serialize(page_layout))
+
+        if not samples:
+            raise ValueError("No layout pages extracted from the sample files")
+
+        logger.info(f"Training layout dictionary on {len(samples)} pages...")
+        try:
+            dictionary = zstd.train_dictionary((dict_size_kb or config.dict_size_kb) * 1024, samples)
+        except Exception as e:
+            raise RuntimeError(f"Dictionary training failed: {e}")
+
+        with open(output_path, 'wb') as f:
+            f.write(dictionary.as_bytes())
+        logger.info(f"Layout dictionary saved: {output_path} ({os.path.getsize(output_path)/1024:.1f} KB)")
+
+        self.dict_path = Path(output_path)
+        self._load_dictionary()
+        return output_path
 
     def extract_layout(self, file_path: str) -> Dict:
         if not HAS_FITZ:
+            if HAS_PLUMBER:
+                logger.warning("PyMuPDF missing - falling back to pdfplumber layout extraction")
+                return self._finish_layout(self._extract_layout_plumber(file_path))
             logger.warning("PyMuPDF missing. Layout extraction skipped.")
             return {}
         
@@ -41,66 +203,159 @@ class MetadataCompressor:
         
         try:
             doc = fitz.open(file_path)
-            logger.info(f"Starting layout extraction, pages: {len(doc)}")
-            
-            for page_index in range(len(doc)):
-                page = doc[page_index]
-                page_num = page_index + 1
-
-                if not self._font_has_tounicode(doc, page):
-                    logger.info(f"Page {page_num}: missing ToUnicode CMap, flagging for raster fallback")
-                    layout[str(page_num)] = {
-                        'width': float(page.rect.width),
-                        'height': float(page.rect.height),
-                        'blocks': [],
-                        'raster_fallback': True
-                    }
-                    continue
-                
-                blocks = []
-                
-                # Use fitz dict extraction - handles all encodings correctly
-                page_dict = page.get_text(
-                    "dict",
-                    flags=fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE
-                )
-                
-                for block in page_dict.get("blocks", []):
-                    if block.get("type") != 0:  # text blocks only
-                        continue
-                    for line in block.get("lines", []):
-                        for span in line.get("spans", []):
-                            text = span.get("text", "")
-                            clean = "".join(c for c in text if c.isprintable()).strip()
-                            if not clean:
-                                continue
-                            
-                            bbox = span.get("bbox", (0, 0, 0, 0))
-                            
-                            blocks.append({
-                                'text': clean,
-                                'x': round(bbox[0], 2),
-                                'y': round(bbox[1], 2),  # fitz y is from top-left
-                                'font': span.get("font", "Helvetica"),
-                                'size': float(span.get("size", 10)),
-                                'flags': span.get("flags", 0)
-                            })
-                
-                layout[str(page_num)] = {
-                    'width': float(page.rect.width),
-                    'height': float(page.rect.height),
-                    'blocks': blocks
-                }
-            
-            doc.close()
-            logger.info(f"Layout extracted: {len(layout)} pages, {sum(len(p['blocks']) for p in layout.values())} blocks")
-            return layout
+            page_count = len(doc)
+            logger.info(f"Starting layout extraction, pages: {page_count}")
+
+            if page_count > self.PARALLEL_PAGE_THRESHOLD:
+                # Each worker opens its own handle once — fitz documents can't be shared
+                doc.close()
+                pages = {}
+                workers = min(os.cpu_count() or 1, page_count)
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker,
+                                         initargs=(file_path,)) as executor:
+                    futures = [
+                        executor.submit(_extract_page_worker, page_index)
+                        for page_index in range(page_count)
+                    ]
+                    for future in as_completed(futures):
+                        page_num, page_dict = future.result()
+                        pages[page_num] = page_dict
+
+                # Keep page order stable regardless of completion order
+                for page_num in range(1, page_count + 1):
+                    layout[str(page_num)] = pages[page_num]
+            else:
+                for page_index in range(page_count):
+                    page_num, page_dict = self._extract_page_layout(doc, page_index)
+                    layout[str(page_num)] = page_dict
+                doc.close()
+
+            return self._finish_layout(layout)
         
         except Exception as e:
             logger.error(f"Layout extraction error: {e}", exc_info=True)
             return {}
+
+    def _finish_layout(self, layout: Dict[str, Dict]) -> Dict:
+        if not layout:
+            return {}
+        fonts = self._intern_fonts(layout)
+        logger.info(f"Layout extracted: {len(layout)} pages, {sum(len(p['text']) for p in layout.values())} spans, {len(fonts)} fonts")
+        return {
+            'fonts': fonts,
+            'coord_scale': COORD_SCALE,
+            'size_scale': SIZE_SCALE,
+            'pages': layout
+        }
+
+    def _extract_layout_plumber(self, file_path: str) -> Dict[str, Dict]:
+        """Fallback when PyMuPDF is unavailable — word-level spans via pdfminer, no style flags."""
+        layout = {}
+        try:
+            with pdfplumber.open(file_path) as pdf:
+                for page_index, page in enumerate(pdf.pages):
+                    lines = defaultdict(list)
+                    for w in page.extract_words(extra_attrs=['fontname', 'size']):
+                        lines[round(w['top'])].append(_Span(
+                            w['text'],
+                            round(w['x0'] * COORD_SCALE),
+                            round(w['top'] * COORD_SCALE),
+                            w['fontname'],
+                            round(w['size'] * SIZE_SCALE),
+                            0
+                        ))
+                    layout[str(page_index + 1)] = self._page_from_lines(
+                        float(page.width), float(page.height), lines
+                    )
+        except Exception as e:
+            logger.error(f"pdfplumber layout extraction error: {e}", exc_info=True)
+            return {}
+        return layout
+
+    @staticmethod
+    def _extract_page_layout(doc: 'fitz.Document', page_index: int) -> Tuple[int, Dict]:
+        """Extract text spans for one page. Returns (page_num, page_dict)."""
+        page = doc[page_index]
+        page_num = page_index + 1
+
+        if not MetadataCompressor._font_has_tounicode(doc, page):
+            logger.info(f"Page {page_num}: missing ToUnicode CMap, flagging for raster fallback")
+            page_layout = MetadataCompressor._empty_page(page.rect.width, page.rect.height)
+            page_layout['raster_fallback'] = True
+            return page_num, page_layout
         
-    def _font_has_tounicode(self, doc: fitz.Document, page: fitz.Page) -> bool:
+        # Spans bucketed by integer baseline — one pass, no pairwise line matching
+        lines = defaultdict(list)
+        _round = round
+        
+        # Use fitz dict extraction - handles all encodings correctly
+        page_dict = page.get_text("dict", flags=_FITZ_FLAGS)
+        
+        for block in page_dict["blocks"]:
+            if block["type"] != 0:  # text blocks only
+                continue
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    text = span["text"]
+                    clean = strip_nonprintable(text).strip()
+                    if not clean:
+                        continue
+                    
+                    bbox = span["bbox"]
+                    
+                    lines[_round(bbox[1])].append(_Span(
+                        clean,
+                        _round(bbox[0] * COORD_SCALE),
+                        _round(bbox[1] * COORD_SCALE),  # fitz y is from top-left
+                        span["font"],
+                        _round(span["size"] * SIZE_SCALE),
+                        span["flags"]
+                    ))
+        
+        return page_num, MetadataCompressor._page_from_lines(page.rect.width, page.rect.height, lines)
+
+    @staticmethod
+    def _page_from_lines(width: float, height: float, lines: Dict[int, List[_Span]]) -> Dict:
+        # Struct-of-arrays: key names appear once per page instead of once per span.
+        # 'lines' holds [y, span_count] runs over the columns.
+        page_layout = MetadataCompressor._empty_page(width, height)
+        columns = [page_layout[field] for field in _SPAN_FIELDS]
+        for y, spans in sorted(lines.items()):
+            page_layout['lines'].append([y, len(spans)])
+            for span in spans:
+                for column, value in zip(columns, span):
+                    column.append(value)
+        return page_layout
+
+    @staticmethod
+    def _empty_page(width: float, height: float) -> Dict:
+        page_layout = {
+            'width': float(width),
+            'height': float(height),
+            'lines': []
+        }
+        for field in _SPAN_FIELDS:
+            page_layout[field] = []
+        return page_layout
+
+    @staticmethod
+    def _intern_fonts(pages: Dict[str, Dict]) -> List[str]:
+        """Replace per-span font names with indices into a shared font table."""
+        fonts = []
+        font_ids = {}
+        for page_layout in pages.values():
+            ids = []
+            for name in page_layout['font']:
+                font_id = font_ids.get(name)
+                if font_id is None:
+                    font_id = font_ids[name] = len(fonts)
+                    fonts.append(name)
+                ids.append(font_id)
+            page_layout['font'] = ids
+        return fonts
+        
+    @staticmethod
+    def _font_has_tounicode(doc: 'fitz.Document', page: 'fitz.Page') -> bool:
         """
         Returns False only if the page uses Type1/TeX fonts with no ToUnicode CMap.
         These are the only fonts that cause garbling.
@@ -109,34 +364,19 @@ class MetadataCompressor:
         for font_info in font_list:
             font_type = font_info[2]  # e.g. "Type1", "TrueType", "CIDFont"
             font_name = font_info[3].lower()
+            # Lazy %-args: skipped entirely once the handler drops DEBUG records
+            logger.debug("Font check: name=%r type=%r", font_name, font_type)
             
             # TeX Computer Modern fonts are always Type1 with no CMap
-            tex_fonts = ['cmr', 'cmmi', 'cmsy', 'cmex', 'cmbx', 'cmtt', 'cmsl', 'cmti']
-            if any(font_name.startswith(f) for f in tex_fonts):
+            if font_name.startswith(_TEX_FONT_PREFIXES):
                 return False
             
-            # Type1 fonts without a subset prefix are likely unencoded
-            if font_type == "Type1" and '+' not in font_info[3]:
+            # Embedded Type1 fonts without a subset prefix are likely unencoded.
+            # Non-embedded ones ('n/a') are the base-14 set, which MuPDF maps itself.
+            if font_type == "Type1" and '+' not in font_info[3] and font_info[1] != 'n/a':
                 return False
         
         return True
-        
-    def _font_has_tounicode(self, doc: fitz.Document, page: fitz.Page) -> bool:
-        """
-        Returns False only if the page uses Type1/TeX fonts with no ToUnicode CMap.
-        These are the fonts most likely to cause garbled text.
-        """
-        font_list = page.get_fonts(full=True)
-
-        # TeX Computer Modern font prefixes (usually Type1 without Unicode)
-        tex_fonts = ['cmr', 'cmmi', 'cmsy', 'cmex', 'cmbx', 'cmtt', 'cmsl', 'cmti']
-
-        for font_info in font_list:
-            font_type = font_info[2]   # e.g. "Type1", "TrueType", "CIDFont"
-            font_name = font_info[3].lower()
-
-            logger.info(f"Font check: name='{font_name}' type='{font_type}'")
-        return True
     
     def _extract_fitz_text_blocks(self, fitz_page) -> List[Dict]:
         """Extract text blocks from PyMuPDF with correct encoding."""
@@ -180,19 +420,53 @@ class MetadataCompressor:
         if not fitz_blocks:
             return plumber_words
         
+        if HAS_SCIPY and plumber_words:
+            matches = self._match_nearest_kdtree(plumber_words, fitz_blocks)
+        else:
+            matches = self._match_nearest_linear(plumber_words, fitz_blocks)
+        
         corrected = []
+        
+        for pw, match_index in zip(plumber_words, matches):
+            # Use PyMuPDF text if found nearby
+            if match_index is not None:
+                best_match = fitz_blocks[match_index]
+                pw['text'] = best_match['text']
+                if 'flags' in best_match:
+                    pw['flags'] = best_match['flags']
+                if best_match.get('font'):
+                    pw['fontname'] = best_match['font']   # overwrite with fitz's font name (has subset prefix)
+                if best_match.get('size'):
+                    pw['size'] = best_match['size']        # fitz size is more reliable than pdfplumber's
+            else:
+                # Check if text looks garbled
+                text = pw.get('text', '')
+                if self._is_garbled(text):
+                    logger.debug(f"Skipping garbled text: {repr(text[:30])}")
+                    continue
+            
+            corrected.append(pw)
+        
+        return corrected
+    
+    @staticmethod
+    def _match_nearest_linear(
+        plumber_words: List[Dict],
+        fitz_blocks: List[Dict]
+    ) -> List[Optional[int]]:
+        """
+        For each plumber word, index of the nearest unused fitz block within
+        MATCH_RADIUS (by center distance), or None. O(N·M) reference version.
+        """
+        matches = []
         used_fitz_indices = set()
         
         for pw in plumber_words:
-            px0, py0 = pw['x0'], pw['top']
-            px1, py1 = pw['x1'], pw['bottom']
-            p_center_x = (px0 + px1) / 2
-            p_center_y = (py0 + py1) / 2
+            p_center_x = (pw['x0'] + pw['x1']) / 2
+            p_center_y = (pw['top'] + pw['bottom']) / 2
             
-            # Find nearest PyMuPDF block
-            best_match = None
             best_distance = float('inf')
-            best_index = -1
+            best_index = None
             
             for idx, fb in enumerate(fitz_blocks):
                 if idx in used_fitz_indices:
@@ -205,33 +479,74 @@ class MetadataCompressor:
                 
                 if dist < best_distance:
                     best_distance = dist
-                    best_match = fb
                     best_index = idx
             
-            # Use PyMuPDF text if found nearby
-            #if best_match and best_distance < 50:
-                #pw['text'] = best_match['text']
-                #if 'flags' in best_match:
-                    #pw['flags'] = best_match['flags']
-            if best_match and best_distance < 50:
+            if best_index is not None and best_distance < MetadataCompressor.MATCH_RADIUS:
                 used_fitz_indices.add(best_index)
-                pw['text'] = best_match['text']
-                if 'flags' in best_match:
-                    pw['flags'] = best_match['flags']
-                if best_match.get('font'):
-                    pw['fontname'] = best_match['font']   # overwrite with fitz's font name (has subset prefix)
-                if best_match.get('size'):
-                    pw['size'] = best_match['size']        # fitz size is more reliable than pdfplumber's
+                matches.append(best_index)
             else:
-                # Check if text looks garbled
-                text = pw.get('text', '')
-                if self._is_garbled(text):
-                    logger.debug(f"Skipping garbled text: {repr(text[:30])}")
-                    continue
+                matches.append(None)
+        
+        return matches
+    
+    @staticmethod
+    def _match_nearest_kdtree(
+        plumber_words: List[Dict],
+        fitz_blocks: List[Dict]
+    ) -> List[Optional[int]]:
+        """
+        Same contract as _match_nearest_linear, but queries a KD-tree built
+        once over fitz block centers — O(N log M) instead of O(N·M).
+        """
+        radius = MetadataCompressor.MATCH_RADIUS
+        centers = np.array([
+            ((fb['x0'] + fb['x1']) / 2, (fb['y0'] + fb['y1']) / 2)
+            for fb in fitz_blocks
+        ])
+        queries = np.array([
+            ((pw['x0'] + pw['x1']) / 2, (pw['top'] + pw['bottom']) / 2)
+            for pw in plumber_words
+        ])
+        tree = cKDTree(centers)
+        
+        # A handful of candidates per word covers almost every case; the
+        # ball query below handles words whose candidates were all taken
+        k = min(len(fitz_blocks), 8)
+        dists, idxs = tree.query(queries, k=k, distance_upper_bound=radius)
+        dists = dists.reshape(len(queries), k)
+        idxs = idxs.reshape(len(queries), k)
+        
+        used = np.zeros(len(fitz_blocks), dtype=bool)
+        matches = []
+        
+        for row in range(len(queries)):
+            match = None
+            exhausted = True
+            for dist, idx in zip(dists[row], idxs[row]):
+                if not dist < radius:
+                    exhausted = False
+                    break
+                if not used[idx]:
+                    match = int(idx)
+                    exhausted = False
+                    break
             
-            corrected.append(pw)
+            if match is None and exhausted:
+                # Every candidate in range was already used — widen the search
+                best_distance = radius
+                for idx in tree.query_ball_point(queries[row], r=radius):
+                    if used[idx]:
+                        continue
+                    dist = float(np.hypot(*(centers[idx] - queries[row])))
+                    if dist < best_distance:
+                        best_distance = dist
+                        match = idx
+            
+            if match is not None:
+                used[match] = True
+            matches.append(match)
         
-        return corrected
+        return matches
     
     @staticmethod
     def _is_garbled(text: str) -> bool:
@@ -239,18 +554,113 @@ class MetadataCompressor:
         if not text or len(text) < 3:
             return False
         
-        problematic = sum(1 for c in text if ord(c) > 127 or c in '\x00\ufffd□')
+        # Non-ASCII count via the C codec ('\ufffd' and '□' are non-ASCII too),
+        # plus NUL bytes — avoids a per-char ord() loop on every word
+        problematic = len(text) - len(text.encode('ascii', 'ignore')) + text.count('\x00')
         return (problematic / len(text)) > 0.4
     
-    def compress(self, data: Any) -> bytes:
-        """Compress data to Zstd."""
-        json_str = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
-        return self.compressor.compress(json_str.encode('utf-8'))
+    def compress(self, data: Any, level: Optional[int] = None) -> bytes:
+        """
+        Compress data to Zstd. level overrides the instance level for this call;
+        by default small payloads drop to SMALL_PAYLOAD_LEVEL.
+        """
+        payload = self._serialize(data)
+        if level is None:
+            level = self.level
+            if len(payload) < self.SMALL_PAYLOAD_SIZE:
+                level = min(level, self.SMALL_PAYLOAD_LEVEL)
+        threads = -1 if len(payload) >= self.THREADED_PAYLOAD_SIZE else 0
+        if self.use_msgpack:
+            payload = _MSGPACK_TAG + payload
+        return self._compressor_for(level, threads).compress(payload)
+
+    def compress_to(self, data: Dict, fileobj: BinaryIO) -> None:
+        """
+        Stream-compress a layout dict into fileobj. Serialization happens one
+        top-level entry (and one page) at a time, so the full payload never
+        exists in memory. The output decodes with decompress()/decompress_from().
+        """
+        with self.compressor.stream_writer(fileobj, closefd=False) as writer:
+            for chunk in self._iter_serialized(data):
+                writer.write(chunk)
+
+    def _serialize(self, data: Any) -> bytes:
+        if self.use_msgpack:
+            return msgpack.packb(data, use_bin_type=True)
+        # orjson emits UTF-8 bytes directly — no intermediate str copy
+        return _json_dumps(data)
+
+    def _iter_serialized(self, data: Dict) -> Iterator[bytes]:
+        """Serialize a dict in pieces, splitting nested dicts (pages) entry by entry."""
+        if self.use_msgpack:
+            packer = msgpack.Packer(use_bin_type=True)
+            yield _MSGPACK_TAG + packer.pack_map_header(len(data))
+            for key, value in data.items():
+                yield packer.pack(key)
+                if isinstance(value, dict):
+                    yield packer.pack_map_header(len(value))
+                    for sub_key, sub_value in value.items():
+                        yield packer.pack(sub_key) + packer.pack(sub_value)
+                else:
+                    yield packer.pack(value)
+            return
+
+        yield b'{'
+        for i, (key, value) in enumerate(data.items()):
+            yield (b',' if i else b'') + _json_dumps(str(key)) + b':'
+            if isinstance(value, dict):
+                yield b'{'
+                for j, (sub_key, sub_value) in enumerate(value.items()):
+                    yield (b',' if j else b'') + _json_dumps(str(sub_key)) + b':' + _json_dumps(sub_value)
+                yield b'}'
+            else:
+                yield _json_dumps(value)
+        yield b'}'
     
     def decompress(self, data: bytes) -> Any:
         """Decompress Zstd data."""
-        decompressed_bytes = self.decompressor.decompress(data)
-        return json.loads(decompressed_bytes.decode('utf-8'))
+        dict_id = zstd.get_frame_parameters(data).dict_id
+        if dict_id and (self._dict is None or self._dict.dict_id() != dict_id):
+            raise RuntimeError(f"Layout was compressed with dictionary {dict_id}, which is not loaded")
+        return self.decompress_from(io.BytesIO(data))
+
+    def decompress_from(self, fileobj: BinaryIO) -> Any:
+        """
+        Decompress a layout streamed from fileobj. Tagged MessagePack payloads
+        are decoded incrementally as chunks arrive; JSON has no incremental
+        parser here, so it is collected and decoded in one shot.
+        """
+        read_size = zstd.DECOMPRESSION_RECOMMENDED_OUTPUT_SIZE
+        with self.decompressor.stream_reader(fileobj, closefd=False) as reader:
+            chunk = reader.read(read_size)
+            if not chunk.startswith(_MSGPACK_TAG):
+                return _json_loads(chunk + reader.read())
+            if not HAS_MSGPACK:
+                raise RuntimeError("Layout payload is MessagePack but msgpack is not installed")
+            chunk = chunk[1:] or reader.read(read_size)
+            # Non-str keys (page numbers) decode the same as on the JSON path;
+            # max_buffer_size=0 lifts the 100MiB cap unpackb never had
+            unpacker = msgpack.Unpacker(raw=False, strict_map_key=False, max_buffer_size=0)
+            while chunk:
+                unpacker.feed(chunk)
+                try:
+                    return unpacker.unpack()
+                except msgpack.OutOfData:
+                    chunk = reader.read(read_size)
+        raise ValueError("Truncated MessagePack layout payload")
+
+_worker_doc = None
+
+
+def _init_page_worker(file_path: str) -> None:
+    """Process-pool initializer — opens the worker's document handle once."""
+    global _worker_doc
+    _worker_doc = fitz.open(file_path)
+
+
+def _extract_page_worker(page_index: int) -> Tuple[int, Dict]:
+    """Process-pool entry point — reuses the handle opened by _init_page_worker."""
+    return MetadataCompressor._extract_page_layout(_worker_doc, page_index)
 
 
 __all__ = ["MetadataCompressor"]
\ No newline at end of file
@@ -1,27 +1,60 @@
 """
-Zypher Text Compressor - Ultra Mode
-Forces maximum compression for text streams.
+Zypher Text Compressor
+Balanced Zstd level for text streams; level 22 only in archive mode.
 """
 import zstandard as zstd
-from typing import Union
+from typing import Optional, Union
+from ..config import config
+from ..utils.zstd_contexts import get_compressor, get_decompressor
 from ..utils.logger import logger
 
+# Level 22 is several times slower than 15 for a few percent of ratio
+ARCHIVE_LEVEL = 22
+
+# Below this a zstd frame (header + checksum) is larger than the text itself
+RAW_THRESHOLD = 128
+# Short texts gain next to nothing from the higher levels' match search
+SMALL_TEXT_SIZE = 4096
+SMALL_TEXT_LEVEL = 3
+# zstd worker threads only pay off once the text spans several jobs
+THREADED_TEXT_SIZE = 1 << 20
+# One-byte payload tags. Untagged payloads from older versions are bare
+# zstd frames, which always start with 0x28 — no overlap with the tags.
+TAG_RAW = b'\x00'
+TAG_ZSTD = b'\x01'
+
 class TextCompressor:
     def __init__(self, level: str = 'high'):
-        # Force Ultra High Compression (Level 22)
-        # Text is small enough that the extra CPU time is negligible
-        self.level = 22 
-        self.compressor = zstd.ZstdCompressor(level=self.level)
-        self.decompressor = zstd.ZstdDecompressor()
-
-    def compress(self, text: Union[str, bytes]) -> bytes:
-        """Compress text string or bytes"""
+        self.level = ARCHIVE_LEVEL if level == 'archive' else config.zstd_level
+
+    @property
+    def compressor(self) -> zstd.ZstdCompressor:
+        return get_compressor(self.level)
+
+    @property
+    def decompressor(self) -> zstd.ZstdDecompressor:
+        return get_decompressor()
+
+    def compress(self, text: Union[str, bytes], level: Optional[int] = None) -> bytes:
+        """Compress text string or bytes; level overrides the instance level for this call"""
         if isinstance(text, str):
             text = text.encode('utf-8')
-        return self.compressor.compress(text)
+        if len(text) < RAW_THRESHOLD:
+            return TAG_RAW + text
+        if level is None:
+            level = self.level
+            if len(text) < SMALL_TEXT_SIZE:
+                level = min(level, SMALL_TEXT_LEVEL)
+        threads = -1 if len(text) >= THREADED_TEXT_SIZE else 0
+        return TAG_ZSTD + get_compressor(level, threads=threads).compress(text)
 
     def decompress(self, data: bytes) -> str:
         """Decompress bytes back to string"""
+        tag = data[:1]
+        if tag == TAG_RAW:
+            return data[1:].decode('utf-8')
+        if tag == TAG_ZSTD:
+            data = data[1:]
         return self.decompressor.decompress(data).decode('utf-8')
 
 __all__ = ["TextCompressor"]
\ No newline at end of file
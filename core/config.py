@@ -15,7 +15,8 @@ DEFAULTS = {
         "max_file_size_mb": 500,
         "max_retries": 3,
         "retry_delay": 1.0,
-        "chunk_size_kb": 64
+        "chunk_size_kb": 64,
+        "zstd_level": 15  # metadata/text streams; 22 only for archive mode
     },
     "batch": {
         "max_workers": None,  # None = auto detect
@@ -23,12 +24,14 @@ DEFAULTS = {
     },
     "dictionary": {
         "path": None,  # None = core/packager/zypher.dict
+        "layout_path": None,  # None = core/compressor/layout.dict
         "max_training_file_size_kb": 100,
         "dict_size_kb": 100
     },
     "extraction": {
         "ocr_enabled": True,
-        "encoding_detection": True
+        "encoding_detection": True,
+        "text_cache": False  # per-page text cache for re-extracted inputs
     },
     "storage": {
         "input_dir": "input",
@@ -41,6 +44,7 @@ DEFAULTS = {
 class ZypherConfig:
     def __init__(self, config_path: str = None):
         self._config = self._deep_copy(DEFAULTS)
+        self._flat = None  # key-path tuple -> value, built on first get()
 
         if config_path:
             self.config_path = Path(config_path)
@@ -59,6 +63,7 @@ class ZypherConfig:
             with open(self.config_path, 'r', encoding='utf-8') as f:
                 user_config = json.load(f)
             self._deep_merge(self._config, user_config)
+            self._flat = None
             logger.info(f"Loaded config from {self.config_path}")
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON in config file: {e} — using defaults")
@@ -77,13 +82,9 @@ class ZypherConfig:
         Get a nested config value by key path.
         e.g. config.get('compression', 'default_level')
         """
-        value = self._config
-        for key in keys:
-            if isinstance(value, dict) and key in value:
-                value = value[key]
-            else:
-                return default
-        return value
+        if self._flat is None:
+            self._flat = self._flatten(self._config)
+        return self._flat.get(keys, default)
 
     def set(self, *keys_and_value):
         """
@@ -95,6 +96,7 @@ class ZypherConfig:
         for key in keys[:-1]:
             target = target.setdefault(key, {})
         target[keys[-1]] = value
+        self._flat = None
 
     # ── Convenience properties ─────────────────────────────────────────────
 
@@ -102,6 +104,10 @@ class ZypherConfig:
     def default_level(self) -> str:
         return self.get('compression', 'default_level', default='high')
 
+    @property
+    def zstd_level(self) -> int:
+        return self.get('compression', 'zstd_level', default=15)
+
     @property
     def max_file_size_mb(self) -> int:
         return self.get('compression', 'max_file_size_mb', default=500)
@@ -129,6 +135,13 @@ class ZypherConfig:
             return Path(path)
         return Path(__file__).parent / 'packager' / 'zypher.dict'
 
+    @property
+    def layout_dict_path(self):
+        path = self.get('dictionary', 'layout_path', default=None)
+        if path:
+            return Path(path)
+        return Path(__file__).parent / 'compressor' / 'layout.dict'
+
     @property
     def dict_size_kb(self) -> int:
         return self.get('dictionary', 'dict_size_kb', default=100)
@@ -141,6 +154,10 @@ class ZypherConfig:
     def ocr_enabled(self) -> bool:
         return self.get('extraction', 'ocr_enabled', default=True)
 
+    @property
+    def text_cache_enabled(self) -> bool:
+        return self.get('extraction', 'text_cache', default=False)
+
     @property
     def input_dir(self) -> str:
         return self.get('storage', 'input_dir', default='input')
@@ -156,18 +173,39 @@ class ZypherConfig:
     # ── Helpers ────────────────────────────────────────────────────────────
 
     @staticmethod
-    def _deep_copy(d: dict) -> dict:
-        import copy
-        return copy.deepcopy(d)
+    def _flatten(config: dict) -> dict:
+        """Map every key path (including intermediate sections) to its value"""
+        flat = {(): config}
+        stack = [((), config)]
+        while stack:
+            prefix, node = stack.pop()
+            for key, value in node.items():
+                path = prefix + (key,)
+                flat[path] = value
+                if isinstance(value, dict):
+                    stack.append((path, value))
+        return flat
+
+    @staticmethod
+    def _deep_copy(value):
+        """Copy a JSON-shaped tree — plain dict/list walk, no deepcopy memo"""
+        if isinstance(value, dict):
+            return {k: ZypherConfig._deep_copy(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [ZypherConfig._deep_copy(v) for v in value]
+        return value
 
     @staticmethod
     def _deep_merge(base: dict, override: dict):
-        """Merge override into base recursively — modifies base in place"""
-        for key, value in override.items():
-            if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                ZypherConfig._deep_merge(base[key], value)
-            else:
-                base[key] = value
+        """Merge override into base — modifies base in place"""
+        stack = [(base, override)]
+        while stack:
+            target, source = stack.pop()
+            for key, value in source.items():
+                if key in target and isinstance(target[key], dict) and isinstance(value, dict):
+                    stack.append((target[key], value))
+                else:
+                    target[key] = value
 
 
 # Singleton — import this everywhere
@@ -4,48 +4,59 @@ Extracts text from documents for search indexing.
 Supports PDF, DOCX, XLSX, PPTX, TXT, CSV, Images.
 """
 import csv
+import datetime
+import importlib
+import importlib.util
 import os
+import posixpath
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Dict, Generator
+from typing import Dict, Generator, Optional
+from .text_cache import TextCache, file_digest
+from ..config import config
 from ..utils.logger import logger
 
-# Top-level optional imports with availability flags
-try:
-    import fitz
-    HAS_FITZ = True
-except ImportError:
-    HAS_FITZ = False
-
-try:
-    from docx import Document as DocxDocument
-    HAS_DOCX = True
-except ImportError:
-    HAS_DOCX = False
-
-try:
-    import openpyxl
-    HAS_OPENPYXL = True
-except ImportError:
-    HAS_OPENPYXL = False
-
-try:
-    from pptx import Presentation
-    HAS_PPTX = True
-except ImportError:
-    HAS_PPTX = False
-
-try:
-    import pytesseract
-    from PIL import Image
-    HAS_OCR = True
-except ImportError:
-    HAS_OCR = False
-
-try:
-    from charset_normalizer import from_path
-    HAS_CHARSET = True
-except ImportError:
-    HAS_CHARSET = False
+
+def _has_module(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+# Availability flags only locate the packages — nothing heavy (MuPDF, PIL,
+# python-docx, ...) is imported until a handler for that format actually runs
+HAS_FITZ = _has_module('fitz')
+HAS_DOCX = _has_module('docx')
+HAS_PPTX = _has_module('pptx')
+# XLSX is parsed straight from the zip — lxml's iterparse is faster,
+# the stdlib one has the same interface
+HAS_LXML = _has_module('lxml')
+HAS_PIL = _has_module('PIL')
+HAS_PYTESSERACT = HAS_PIL and _has_module('pytesseract')
+# tesserocr keeps one Tesseract engine loaded in-process instead of
+# spawning a tesseract subprocess (and reloading the model) per page
+HAS_TESSEROCR = HAS_PIL and _has_module('tesserocr')
+HAS_OCR = HAS_PYTESSERACT or HAS_TESSEROCR
+HAS_CHARSET = _has_module('charset_normalizer')
+
+_modules = {}
+
+
+def _lazy(name: str):
+    """Import a module on first use and keep it for later calls."""
+    module = _modules.get(name)
+    if module is None:
+        module = _modules[name] = importlib.import_module(name)
+    return module
+
+
+def _xml_etree():
+    return _lazy('lxml.etree' if HAS_LXML else 'xml.etree.ElementTree')
 
 
 class Extractor:
@@ -53,6 +64,38 @@ class Extractor:
         '.pdf', '.jpg', '.jpeg', '.png',
         '.tiff', '.docx', '.xlsx', '.pptx', '.txt', '.csv'
     }
+    # Below this, process-pool spawn costs more than it saves
+    PARALLEL_PAGE_THRESHOLD = 8
+    # PyMuPDF text extraction stops scaling past ~6 workers
+    MAX_PDF_WORKERS = 6
+    # Page batches handed to each worker: enough to even out slow pages
+    # without queueing a task per page
+    PDF_CHUNKS_PER_WORKER = 4
+    # Extension -> handler method name, resolved per call with getattr
+    _STREAMERS = {
+        '.pdf':  '_stream_pdf',
+        '.docx': '_stream_docx',
+        '.xlsx': '_stream_xlsx',
+        '.pptx': '_stream_pptx',
+        '.txt':  '_stream_txt',
+        '.csv':  '_stream_csv',
+        '.jpg':  '_stream_image',
+        '.jpeg': '_stream_image',
+        '.png':  '_stream_image',
+        '.tiff': '_stream_image',
+    }
+    # TXT/CSV are yielded in pages of this many lines/rows to keep memory bounded
+    LINES_PER_PAGE = 4096
+    # Encoding detection only needs a sample, not the whole file
+    ENCODING_SAMPLE_BYTES = 65536
+
+    def __init__(self, use_cache: Optional[bool] = None, cache_dir: str = None):
+        # Per-page text keyed by file content hash — reindexing a known PDF skips
+        # extraction. Off unless asked for (or enabled in config): one-shot runs
+        # would only pay for hashing the file and writing the cache DB.
+        if use_cache is None:
+            use_cache = config.text_cache_enabled
+        self.text_cache = TextCache(cache_dir) if use_cache else None
 
     def extract_text_for_search(self, file_path: str) -> Dict:
         """
@@ -91,23 +134,11 @@ class Extractor:
         """
         ext = Path(file_path).suffix.lower()
 
-        extractors = {
-            '.pdf':  self._stream_pdf,
-            '.docx': self._stream_docx,
-            '.xlsx': self._stream_xlsx,
-            '.pptx': self._stream_pptx,
-            '.txt':  self._stream_txt,
-            '.csv':  self._stream_csv,
-            '.jpg':  self._stream_image,
-            '.jpeg': self._stream_image,
-            '.png':  self._stream_image,
-            '.tiff': self._stream_image,
-        }
-
-        if ext not in extractors:
+        streamer = self._STREAMERS.get(ext)
+        if streamer is None:
             raise ValueError(f"Unsupported format: {ext}")
 
-        yield from extractors[ext](file_path)
+        yield from getattr(self, streamer)(file_path)
 
     # -------------------------
     # PDF
@@ -116,31 +147,45 @@ class Extractor:
         if not HAS_FITZ:
             raise ImportError("PyMuPDF not installed — pip install pymupdf")
 
+        fitz = _lazy('fitz')
         try:
             doc = fitz.open(file_path)
         except fitz.FileDataError as e:
             raise ValueError(f"Corrupted or invalid PDF: {e}")
 
         try:
-            for i in range(len(doc)):
-                page = doc[i]
-                text = page.get_text("text").strip()
-
-                # Scanned PDF detection — if no text, try OCR
-                if not text and HAS_OCR:
-                    logger.info(f"Page {i+1} has no text — attempting OCR")
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    text = pytesseract.image_to_string(img).strip()
-
-                yield {
-                    'page_num': i + 1,
-                    'text': text,
-                    'scanned': not page.get_text("text").strip() and bool(text)
-                }
+            page_count = len(doc)
+            file_hash = None
+            if self.text_cache:
+                file_hash = file_digest(file_path)
+                cached = self.text_cache.get_pages(file_hash, page_count)
+                if cached is not None:
+                    logger.info(f"Text cache hit: {file_path} ({page_count} pages)")
+                    yield from cached
+                    return
+
+            if page_count < self.PARALLEL_PAGE_THRESHOLD:
+                pages = (_extract_pdf_page_text(doc, i) for i in range(page_count))
+                yield from self._cache_pages(file_hash, pages)
+                return
         finally:
             doc.close()
 
+        # Each worker opens its own handle once — MuPDF objects can't cross
+        # processes. Pages go out in chunks (a few per worker) so a long PDF
+        # doesn't queue one pickled task per page; map() yields in page order.
+        workers = min(os.cpu_count() or 1, self.MAX_PDF_WORKERS, page_count)
+        chunksize = max(1, page_count // (workers * self.PDF_CHUNKS_PER_WORKER))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pdf_page_worker,
+                                 initargs=(file_path,)) as executor:
+            pages = executor.map(_extract_pdf_page_worker, range(page_count), chunksize=chunksize)
+            yield from self._cache_pages(file_hash, pages)
+
+    def _cache_pages(self, file_hash: str, pages) -> Generator:
+        if file_hash is None:
+            return pages
+        return self.text_cache.write_through(file_hash, pages)
+
     # -------------------------
     # DOCX
     # -------------------------
@@ -149,11 +194,12 @@ class Extractor:
             raise ImportError("python-docx not installed — pip install python-docx")
 
         try:
-            doc = DocxDocument(file_path)
+            doc = _lazy('docx').Document(file_path)
         except Exception as e:
             raise ValueError(f"Corrupted or invalid DOCX: {e}")
 
-        paragraphs = [p.text.strip() for p in doc.paragraphs if p.text.strip()]
+        # .text rebuilds the string from runs on every access — read it once
+        paragraphs = [text for p in doc.paragraphs if (text := p.text.strip())]
         yield {
             'page_num': 1,
             'text': '\n'.join(paragraphs)
@@ -163,20 +209,27 @@ class Extractor:
     # XLSX
     # -------------------------
     def _stream_xlsx(self, file_path: str) -> Generator:
-        if not HAS_OPENPYXL:
-            raise ImportError("openpyxl not installed — pip install openpyxl")
-
+        """
+        Stream rows straight from the sheet XML instead of building openpyxl
+        Cell objects. Each row element is dropped once read, so memory stays
+        flat regardless of sheet size. Values read as openpyxl's would (ints,
+        floats, dates as datetimes), except percentage-formatted cells, which
+        keep their '%' form.
+        """
+        xml_etree = _xml_etree()
         try:
-            wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-        except Exception as e:
+            zf = zipfile.ZipFile(file_path)
+            shared = self._xlsx_shared_strings(zf)
+            sheets, epoch = self._xlsx_sheets(zf)
+            styles = self._xlsx_styles(zf)
+        except (zipfile.BadZipFile, KeyError, xml_etree.ParseError) as e:
             raise ValueError(f"Corrupted or invalid XLSX: {e}")
 
         try:
-            for sheet_num, sheet_name in enumerate(wb.sheetnames):
-                ws = wb[sheet_name]
+            for sheet_num, (sheet_name, sheet_path) in enumerate(sheets):
                 rows = []
-                for row in ws.iter_rows(values_only=True):
-                    row_text = '\t'.join(str(c) for c in row if c is not None)
+                for row in self._xlsx_rows(zf, sheet_path, shared, styles, epoch):
+                    row_text = '\t'.join(row)
                     if row_text.strip():
                         rows.append(row_text)
                 yield {
@@ -185,7 +238,106 @@ class Extractor:
                     'text': '\n'.join(rows)
                 }
         finally:
-            wb.close()
+            zf.close()
+
+    def _xlsx_shared_strings(self, zf: zipfile.ZipFile) -> list:
+        if 'xl/sharedStrings.xml' not in zf.namelist():
+            return []
+        strings = []
+        with zf.open('xl/sharedStrings.xml') as f:
+            for _, elem in _xml_etree().iterparse(f):
+                if _local_name(elem.tag) == 'si':
+                    strings.append(_xlsx_string(elem))
+                    elem.clear()
+        return strings
+
+    def _xlsx_styles(self, zf: zipfile.ZipFile) -> list:
+        """Per cell-style index: 'date', 'percent' or None, from the number format."""
+        if 'xl/styles.xml' not in zf.namelist():
+            return []
+        root = _xml_etree().fromstring(zf.read('xl/styles.xml'))
+        formats = dict(_XLSX_BUILTIN_FORMATS)
+        cell_xfs = None
+        for elem in root:
+            name = _local_name(elem.tag)
+            if name == 'numFmts':
+                for fmt in elem:
+                    formats[int(fmt.get('numFmtId', -1))] = fmt.get('formatCode', '')
+            elif name == 'cellXfs':
+                cell_xfs = elem
+        if cell_xfs is None:
+            return []
+        return [
+            _xlsx_format_kind(formats.get(int(xf.get('numFmtId', 0)), ''))
+            for xf in cell_xfs if _local_name(xf.tag) == 'xf'
+        ]
+
+    def _xlsx_sheets(self, zf: zipfile.ZipFile) -> tuple:
+        """Return ([(sheet_name, zip_path)] in workbook order, date epoch)."""
+        xml_etree = _xml_etree()
+        rels = {}
+        for rel in xml_etree.fromstring(zf.read('xl/_rels/workbook.xml.rels')):
+            target = rel.get('Target', '')
+            if target.startswith('/'):
+                target = target.lstrip('/')
+            else:
+                target = posixpath.normpath(posixpath.join('xl', target))
+            rels[rel.get('Id')] = target
+
+        sheets = []
+        epoch = _XLSX_WINDOWS_EPOCH
+        for elem in xml_etree.fromstring(zf.read('xl/workbook.xml')).iter():
+            name = _local_name(elem.tag)
+            if name == 'sheet':
+                rel_id = next((v for k, v in elem.attrib.items() if _local_name(k) == 'id'), None)
+                if rel_id in rels:
+                    sheets.append((elem.get('name'), rels[rel_id]))
+            elif name == 'workbookPr' and elem.get('date1904') in ('1', 'true'):
+                epoch = _XLSX_MAC_EPOCH
+        return sheets, epoch
+
+    def _xlsx_rows(self, zf: zipfile.ZipFile, sheet_path: str, shared: list,
+                   styles: list, epoch: datetime.datetime) -> Generator:
+        """Yield each row as a list of non-empty cell strings."""
+        with zf.open(sheet_path) as f:
+            parent = None
+            for event, elem in _xml_etree().iterparse(f, events=('start', 'end')):
+                tag = _local_name(elem.tag)
+                if event == 'start':
+                    if tag == 'sheetData':
+                        parent = elem
+                    continue
+                if tag != 'row':
+                    continue
+
+                cells = []
+                for cell in elem:
+                    if _local_name(cell.tag) != 'c':
+                        continue
+                    cell_type = cell.get('t')
+                    value = None
+                    for child in cell:
+                        name = _local_name(child.tag)
+                        if name == 'v':
+                            value = child.text
+                        elif name == 'is':
+                            value = _xlsx_string(child)
+                    if value is None:
+                        continue
+                    if cell_type == 's':
+                        value = shared[int(value)]
+                    elif cell_type == 'b':
+                        value = 'True' if value == '1' else 'False'
+                    elif cell_type in (None, 'n'):
+                        style = int(cell.get('s', 0))
+                        kind = styles[style] if style < len(styles) else None
+                        value = _xlsx_number(value, kind, epoch)
+                    cells.append(value)
+                yield cells
+
+                elem.clear()
+                if parent is not None:
+                    parent.remove(elem)
 
     # -------------------------
     # PPTX
@@ -195,7 +347,7 @@ class Extractor:
             raise ImportError("python-pptx not installed — pip install python-pptx")
 
         try:
-            prs = Presentation(file_path)
+            prs = _lazy('pptx').Presentation(file_path)
         except Exception as e:
             raise ValueError(f"Corrupted or invalid PPTX: {e}")
 
@@ -217,13 +369,13 @@ class Extractor:
     def _extract_pptx_shapes(self, shapes, text_parts: list):
         """Recursively extract text from all shape types including tables and groups"""
         for shape in shapes:
-            if shape.has_text_frame and shape.text.strip():
-                text_parts.append(shape.text.strip())
+            if shape.has_text_frame and (text := shape.text.strip()):
+                text_parts.append(text)
             if shape.has_table:
                 for row in shape.table.rows:
-                    row_text = '\t'.join(
-                        cell.text.strip() for cell in row.cells if cell.text.strip()
-                    )
+                    row_text = '\t'.join([
+                        text for cell in row.cells if (text := cell.text.strip())
+                    ])
                     if row_text:
                         text_parts.append(row_text)
             # Recurse into grouped shapes
@@ -237,8 +389,17 @@ class Extractor:
         encoding = self._detect_encoding(file_path)
         try:
             with open(file_path, 'r', encoding=encoding, errors='replace') as f:
-                text = f.read().strip()
-            yield {'page_num': 1, 'text': text}
+                page_num = 0
+                while True:
+                    lines = list(islice(f, self.LINES_PER_PAGE))
+                    if not lines:
+                        break
+                    text = ''.join(lines).strip()
+                    if text:
+                        page_num += 1
+                        yield {'page_num': page_num, 'text': text}
+                if page_num == 0:
+                    yield {'page_num': 1, 'text': ''}
         except Exception as e:
             raise ValueError(f"Could not read text file: {e}")
 
@@ -249,14 +410,20 @@ class Extractor:
         """Proper CSV parsing preserving tabular structure"""
         encoding = self._detect_encoding(file_path)
         try:
+            page_num = 0
             rows = []
             with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
                 reader = csv.reader(f)
                 for row in reader:
-                    row_text = '\t'.join(cell.strip() for cell in row if cell.strip())
+                    row_text = '\t'.join([c for cell in row if (c := cell.strip())])
                     if row_text:
                         rows.append(row_text)
-            yield {'page_num': 1, 'text': '\n'.join(rows)}
+                    if len(rows) == self.LINES_PER_PAGE:
+                        page_num += 1
+                        yield {'page_num': page_num, 'text': '\n'.join(rows)}
+                        rows = []
+            if rows or page_num == 0:
+                yield {'page_num': page_num + 1, 'text': '\n'.join(rows)}
         except Exception as e:
             raise ValueError(f"Could not read CSV file: {e}")
 
@@ -265,12 +432,12 @@ class Extractor:
     # -------------------------
     def _stream_image(self, file_path: str) -> Generator:
         if not HAS_OCR:
-            logger.warning("pytesseract not installed — image OCR skipped")
+            logger.warning("pytesseract/tesserocr not installed — image OCR skipped")
             yield {'page_num': 1, 'text': ''}
             return
 
         try:
-            text = pytesseract.image_to_string(Image.open(file_path)).strip()
+            text = _ocr_image(_lazy('PIL.Image').open(file_path))
             yield {'page_num': 1, 'text': text}
         except Exception as e:
             raise ValueError(f"Image OCR failed: {e}")
@@ -279,10 +446,12 @@ class Extractor:
     # Helpers
     # -------------------------
     def _detect_encoding(self, file_path: str) -> str:
-        """Detect file encoding using charset_normalizer, fallback to utf-8"""
+        """Detect file encoding from the first 64 KiB using charset_normalizer, fallback to utf-8"""
         if HAS_CHARSET:
             try:
-                result = from_path(file_path).best()
+                with open(file_path, 'rb') as f:
+                    sample = f.read(self.ENCODING_SAMPLE_BYTES)
+                result = _lazy('charset_normalizer').from_bytes(sample).best()
                 if result:
                     return result.encoding
             except Exception:
@@ -300,6 +469,126 @@ class Extractor:
         }
 
 
+def _local_name(tag: str) -> str:
+    """Strip the XML namespace — transitional and strict OOXML use different URIs."""
+    return tag.rsplit('}', 1)[-1]
+
+
+_XLSX_WINDOWS_EPOCH = datetime.datetime(1899, 12, 30)
+_XLSX_MAC_EPOCH = datetime.datetime(1904, 1, 1)
+# Built-in number formats that render as dates/times or percentages
+_XLSX_BUILTIN_FORMATS = {
+    9: '0%', 10: '0.00%',
+    14: 'mm-dd-yy', 15: 'd-mmm-yy', 16: 'd-mmm', 17: 'mmm-yy',
+    18: 'h:mm AM/PM', 19: 'h:mm:ss AM/PM', 20: 'h:mm', 21: 'h:mm:ss',
+    22: 'm/d/yy h:mm', 45: 'mm:ss', 46: '[h]:mm:ss', 47: 'mmss.0',
+}
+# Quoted literals, escaped characters and [colour]/[condition] sections
+# can't make a format a date one (elapsed-time [h]/[m]/[s] can)
+_XLSX_FORMAT_NOISE = re.compile(r'"[^"]*"|\\.|\[(?![hms]+\])[^\]]*\]', re.IGNORECASE)
+_XLSX_DATE_CHARS = re.compile(r'(?<![_\\])[dmyhs]', re.IGNORECASE)
+
+
+def _xlsx_format_kind(format_code: str):
+    """'date', 'percent' or None for a number format code (first section only)."""
+    code = _XLSX_FORMAT_NOISE.sub('', format_code.split(';', 1)[0])
+    if '%' in code:
+        return 'percent'
+    if _XLSX_DATE_CHARS.search(code):
+        return 'date'
+    return None
+
+
+def _xlsx_number(text: str, kind, epoch: datetime.datetime) -> str:
+    """Render a numeric cell the way openpyxl's values read, plus '%' for percentages."""
+    try:
+        number = float(text) if any(c in text for c in '.eE') else int(text)
+    except ValueError:
+        return text
+    if kind == 'percent':
+        return f"{number * 100:g}%"
+    if kind == 'date':
+        # Same conversion as openpyxl's from_excel
+        day, fraction = divmod(number, 1)
+        diff = datetime.timedelta(milliseconds=round(fraction * 86_400_000))
+        if 0 <= number < 1 and diff.days == 0:
+            return str((datetime.datetime.min + diff).time())
+        if 0 < number < 60 and epoch == _XLSX_WINDOWS_EPOCH:
+            day += 1  # Excel's phantom 1900-02-29
+        try:
+            return str(epoch + datetime.timedelta(days=day) + diff)
+        except OverflowError:
+            return text
+    return str(number)
+
+
+def _xlsx_string(elem) -> str:
+    """
+    Text of an <si>/<is> string: plain <t> or rich-text <r><t> runs.
+    Phonetic <rPh> runs (furigana) are not part of the cell value.
+    """
+    parts = []
+    for child in elem:
+        name = _local_name(child.tag)
+        if name == 't':
+            parts.append(child.text or '')
+        elif name == 'r':
+            parts.extend(t.text or '' for t in child if _local_name(t.tag) == 't')
+    return ''.join(parts)
+
+
+_tess_local = threading.local()
+
+# Render resolution for scanned pages (the old 2x matrix was 144 DPI)
+OCR_DPI = 150
+
+
+def _ocr_image(img) -> str:
+    """OCR one image, reusing this thread's Tesseract engine when tesserocr is available."""
+    if HAS_TESSEROCR:
+        api = getattr(_tess_local, 'api', None)
+        if api is None:
+            api = _tess_local.api = _lazy('tesserocr').PyTessBaseAPI()
+        api.SetImage(img)
+        return api.GetUTF8Text().strip()
+    return _lazy('pytesseract').image_to_string(img).strip()
+
+
+def _extract_pdf_page_text(doc, page_index: int) -> Dict:
+    page = doc[page_index]
+    text = page.get_text("text").strip()
+    scanned = False
+
+    # Scanned PDF detection — if no text, try OCR
+    if not text and HAS_OCR:
+        logger.info(f"Page {page_index+1} has no text — attempting OCR")
+        # Tesseract binarizes anyway — one gray channel is a third of the RGB bytes
+        pix = page.get_pixmap(dpi=OCR_DPI, colorspace=_lazy('fitz').csGRAY, alpha=False)
+        img = _lazy('PIL.Image').frombytes("L", [pix.width, pix.height], pix.samples)
+        text = _ocr_image(img)
+        scanned = bool(text)
+
+    return {
+        'page_num': page_index + 1,
+        'text': text,
+        'scanned': scanned
+    }
+
+
+_worker_doc = None
+
+
+def _init_pdf_page_worker(file_path: str) -> None:
+    """Process-pool initializer — opens the worker's document handle once."""
+    global _worker_doc
+    _worker_doc = _lazy('fitz').open(file_path)
+
+
+def _extract_pdf_page_worker(page_index: int) -> Dict:
+    """Process-pool entry point — reuses the handle opened by _init_pdf_page_worker."""
+    return _extract_pdf_page_text(_worker_doc, page_index)
+
+
 __all__ = ["Extractor"]
 '''
 
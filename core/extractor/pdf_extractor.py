@@ -4,11 +4,19 @@ Extracts text from PDFs for search indexing.
 Called at upload time, results stored in search database.
 """
 import fitz
-from typing import Dict
+from typing import Dict, Optional
+from .text_cache import TextCache, file_digest
+from ..config import config
 from ..utils.logger import logger
 
 
 class PDFExtractor:
+    def __init__(self, use_cache: Optional[bool] = None, cache_dir: str = None):
+        # Off by default (see extraction.text_cache); enable where inputs are re-extracted
+        if use_cache is None:
+            use_cache = config.text_cache_enabled
+        self.text_cache = TextCache(cache_dir) if use_cache else None
+
     def extract_text_for_search(self, pdf_path: str) -> Dict:
         """
         Extracts text from each page for search indexing.
@@ -23,15 +31,24 @@ class PDFExtractor:
             doc = fitz.open(pdf_path)
             full_text = []
 
-            for page_index in range(len(doc)):
-                page = doc[page_index]
-                text = page.get_text("text").strip()
+            pages = None
+            if self.text_cache:
+                file_hash = file_digest(pdf_path)
+                pages = self.text_cache.get_pages(file_hash, len(doc))
+            if pages is None:
+                pages = (
+                    {'page_num': page_index + 1, 'text': doc[page_index].get_text("text").strip()}
+                    for page_index in range(len(doc))
+                )
+                if self.text_cache:
+                    pages = self.text_cache.write_through(file_hash, pages)
 
+            for page in pages:
                 result['pages'].append({
-                    'page_num': page_index + 1,
-                    'text': text
+                    'page_num': page['page_num'],
+                    'text': page['text']
                 })
-                full_text.append(text)
+                full_text.append(page['text'])
 
             result['full_text'] = '\n'.join(full_text)
             result['page_count'] = len(doc)
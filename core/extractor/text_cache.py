@@ -0,0 +1,81 @@
+"""
+Zypher Text Cache
+Persistent per-page search text keyed by (file hash, page number).
+Re-indexing a document that was already extracted becomes a lookup.
+"""
+import hashlib
+import mmap
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+from ..config import config
+from ..utils.logger import logger
+
+
+def file_digest(file_path: str) -> str:
+    """BLAKE2b-128 of the file contents, hashed straight from an mmap."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
+    return h.hexdigest()
+
+
+class TextCache:
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else Path(config.output_dir) / '.text_cache'
+        self.db_path = self.cache_dir / 'pages.db'
+
+    def _connect(self) -> sqlite3.Connection:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "file_hash TEXT NOT NULL, page_num INTEGER NOT NULL, "
+            "text TEXT NOT NULL, scanned INTEGER NOT NULL, "
+            "PRIMARY KEY (file_hash, page_num))"
+        )
+        return conn
+
+    def get_pages(self, file_hash: str, page_count: int) -> Optional[list]:
+        """Return all cached pages in order, or None unless every page is cached."""
+        try:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(
+                    "SELECT page_num, text, scanned FROM pages WHERE file_hash = ? ORDER BY page_num",
+                    (file_hash,)
+                ).fetchall()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Text cache read failed: {e}")
+            return None
+
+        if len(rows) != page_count:
+            return None
+        return [
+            {'page_num': page_num, 'text': text, 'scanned': bool(scanned)}
+            for page_num, text, scanned in rows
+        ]
+
+    def write_through(self, file_hash: str, pages: Iterable[Dict]) -> Iterator[Dict]:
+        """Yield pages unchanged, storing each one. Commits once all pages are through."""
+        try:
+            conn = self._connect()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Text cache unavailable: {e}")
+            yield from pages
+            return
+
+        # Connection context commits on completion, rolls back if the consumer stops early
+        with closing(conn), conn:
+            for page in pages:
+                conn.execute(
+                    "INSERT OR REPLACE INTO pages (file_hash, page_num, text, scanned) VALUES (?, ?, ?, ?)",
+                    (file_hash, page['page_num'], page['text'], int(page.get('scanned', False)))
+                )
+                yield page
+
+
+__all__ = ["TextCache", "file_digest"]
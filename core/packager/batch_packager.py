@@ -2,17 +2,68 @@
 Zypher Batch Packager
 Compresses multiple files concurrently with progress tracking.
 """
+import logging
 import os
+import queue
+import threading
 import time
-from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Optional, Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Iterator, Optional, Callable
 from ..utils.logger import logger
 from .packager import Packager
 from ..config import config
 
+# One Packager per worker process, built by _worker_init — the dictionary
+# is loaded once per process instead of once per file
+_worker_packager: Optional[Packager] = None
+
+
+def _worker_init(dict_path: str, max_file_size_mb: int):
+    global _worker_packager
+    # The pool already runs one process per core — zstd worker threads on
+    # top would oversubscribe every core, so each process compresses single-threaded
+    _worker_packager = Packager(dict_path=dict_path, max_file_size_mb=max_file_size_mb, threads=0)
+
+
+def _compress_in_worker(input_path: str, output_path: str, level: str, max_retries: int, retry_delay: float) -> Dict:
+    return _compress_job(_worker_packager, input_path, output_path, level, max_retries, retry_delay)
+
+
+def _compress_job(
+    packager: Packager,
+    input_path: str,
+    output_path: str,
+    level: str,
+    max_retries: int,
+    retry_delay: float
+) -> Dict:
+    result = packager.compress_with_retry(
+        str(input_path),
+        str(output_path),
+        compression_level=level,
+        on_progress=None,
+        max_retries=max_retries,
+        retry_delay=retry_delay
+    )
+    result['input_file'] = input_path
+    return result
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        # Missing/unreadable files fail fast in the worker — schedule them last
+        return -1
+
 
 class BatchPackager:
+    # Per-file progress lines, formatted by the log thread rather than the
+    # completion loop
+    PROGRESS_TEMPLATE = "   [{}/{}] {} — {:.1f}% saved"
+    FAILURE_TEMPLATE = "   [{}/{}] {} — {}"
+
     def __init__(
         self,
         dict_path: str = None,
@@ -20,18 +71,44 @@ class BatchPackager:
         compression_level: str = 'high',
         max_file_size_mb: int = 500,
         max_retries: int = 3,
-        retry_delay: float = 1.0
+        retry_delay: float = 1.0,
+        use_processes: bool = True
     ):
         self.compression_level = compression_level
         self.max_retries = max_retries
         self.retry_delay = retry_delay
-        # Default workers — I/O bound so more than CPU count is fine
-        self.max_workers = max_workers or min(32, (os.cpu_count() or 4) * 2)
+        self.max_file_size_mb = max_file_size_mb
+        # Compression and checksumming are CPU-bound: one process per core.
+        # The thread fallback keeps the old oversubscribed default.
+        self.use_processes = use_processes
+        if use_processes:
+            self.max_workers = max_workers or (os.cpu_count() or 4)
+        else:
+            self.max_workers = max_workers or min(32, (os.cpu_count() or 4) * 2)
 
-        # Single Packager instance shared across threads
-        # Dictionary loaded once into memory, reused for all files
+        # In-process Packager: supported formats, and the shared instance for thread mode
         self.packager = Packager(dict_path=dict_path, max_file_size_mb=max_file_size_mb)
 
+        # Worker pool is created on first use and kept across batches, so
+        # later batches skip process start-up and dictionary loading
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        self.close(wait=False)
+
+    def close(self, wait: bool = True):
+        """Shut down the worker pool. A later batch starts a fresh one."""
+        executor = getattr(self, '_executor', None)
+        if executor is not None:
+            self._executor = None
+            executor.shutdown(wait=wait)
+
     def compress_directory(
         self,
         input_dir: str,
@@ -51,36 +128,20 @@ class BatchPackager:
         Returns:
             summary dict with results, stats, and failures
         """
-        input_path = Path(input_dir)
-        if not input_path.exists():
+        if not os.path.exists(input_dir):
             raise ValueError(f"Input directory not found: {input_dir}")
 
-        # Collect files
-        if recursive:
-            files = [
-                f for f in input_path.rglob('*')
-                if f.is_file() and f.suffix.lower() in self.packager.SUPPORTED_FORMATS
-            ]
-        else:
-            files = [
-                f for f in input_path.iterdir()
-                if f.is_file() and f.suffix.lower() in self.packager.SUPPORTED_FORMATS
-            ]
+        # Build output paths mirroring input structure
+        jobs = []
+        for f in self._iter_supported_files(input_dir, recursive):
+            relative_dir = os.path.dirname(os.path.relpath(f, input_dir))
+            stem = os.path.splitext(os.path.basename(f))[0]
+            jobs.append((f, os.path.join(output_dir, relative_dir, stem + '.zpkg')))
 
-        if not files:
+        if not jobs:
             logger.warning(f"No supported files found in {input_dir}")
             return self._empty_summary()
 
-        # Build output paths mirroring input structure
-        jobs = []
-        for f in files:
-            if recursive:
-                relative = f.relative_to(input_path)
-                out = Path(output_dir) / relative.parent / (f.stem + '.zpkg')
-            else:
-                out = Path(output_dir) / (f.stem + '.zpkg')
-            jobs.append((f, out))
-
         logger.info(f" Batch compressing {len(jobs)} files with {self.max_workers} workers...")
         return self._run(jobs, on_progress)
 
@@ -98,13 +159,30 @@ class BatchPackager:
             output_dir: directory to write .zpkg files
             on_progress: optional callback(completed, total, result)
         """
-        jobs = [
-            (Path(f), Path(output_dir) / (Path(f).stem + '.zpkg'))
-            for f in file_paths
-        ]
+        jobs = []
+        for f in file_paths:
+            f = os.fspath(f)
+            stem = os.path.splitext(os.path.basename(f))[0]
+            jobs.append((f, os.path.join(output_dir, stem + '.zpkg')))
         logger.info(f" Batch compressing {len(jobs)} files with {self.max_workers} workers...")
         return self._run(jobs, on_progress)
 
+    def _iter_supported_files(self, directory: str, recursive: bool) -> Iterator[str]:
+        """
+        Yield paths of supported files under directory. scandir serves
+        file/dir type from the readdir results, so there is no stat per entry.
+        """
+        supported = frozenset(self.packager.SUPPORTED_FORMATS)
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False):
+                    name = entry.name
+                    dot = name.rfind('.')
+                    if dot > 0 and name[dot:].lower() in supported:
+                        yield entry.path
+                elif recursive and entry.is_dir(follow_symlinks=False):
+                    yield from self._iter_supported_files(entry.path, recursive)
+
     def _run(
         self,
         jobs: List[tuple],
@@ -115,64 +193,156 @@ class BatchPackager:
         failures = []
         total = len(jobs)
         completed = 0
+        # Running byte totals, so the summary needs no extra passes over results
+        total_original = 0
+        total_compressed = 0
 
-        # Ensure all output directories exist
-        for _, out in jobs:
-            out.parent.mkdir(parents=True, exist_ok=True)
+        # Ensure all output directories exist — one makedirs per distinct directory
+        for out_dir in {os.path.dirname(out) for _, out in jobs}:
+            os.makedirs(out_dir or '.', exist_ok=True)
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_job = {
-                executor.submit(self._compress_one, inp, out): (inp, out)
-                for inp, out in jobs
-            }
+        # Largest first (LPT scheduling): a big file submitted last would leave
+        # every other worker idle while it finishes
+        jobs = sorted(jobs, key=lambda job: _file_size(job[0]), reverse=True)
 
-            for future in as_completed(future_to_job):
-                inp, out = future_to_job[future]
-                completed += 1
+        executor = self._get_executor()
+        broken = False
 
-                try:
-                    result = future.result()
-                    results.append(result)
+        # Progress lines go through a queue drained by one thread, so the
+        # completion loop never blocks on the logging lock or stdout
+        log_q = queue.SimpleQueue()
+        log_thread = threading.Thread(target=self._drain_log, args=(log_q,), daemon=True)
+        log_thread.start()
 
-                    if on_progress:
-                        on_progress(completed, total, result)
+        # Sliding window: at most 2x workers futures in flight, topped up as
+        # each one finishes — live state stays O(workers) for huge batches
+        pending_jobs = iter(jobs)
+        in_flight = {}
 
-                    logger.info(
-                        f"   [{completed}/{total}] {inp.name} "
-                        f"— {result['space_saved_percent']:.1f}% saved"
-                    )
+        def submit_next() -> None:
+            job = next(pending_jobs, None)
+            if job is not None:
+                in_flight[self._submit(executor, *job)] = job
 
-                except Exception as e:
-                    failure = {
-                        'file': str(inp),
-                        'error': str(e)
-                    }
-                    failures.append(failure)
+        try:
+            for _ in range(self.max_workers * 2):
+                submit_next()
 
-                    if on_progress:
-                        on_progress(completed, total, failure)
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    inp, out = in_flight.pop(future)
+                    completed += 1
+                    result = self._record(future, inp, completed, total, results, failures, on_progress, log_q)
+                    if result is not None:
+                        total_original += result['original_size']
+                        total_compressed += result['compressed_size']
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        broken = True
+                    elif not broken:
+                        submit_next()
+        finally:
+            # Pool is done: stop the log thread once it has written every
+            # queued line, so the summary below always comes after them
+            log_q.put(None)
+            log_thread.join()
 
-                    logger.error(f"   [{completed}/{total}] {inp.name} — {e}")
+        if broken:
+            # A worker died mid-batch — report the unsubmitted jobs and drop
+            # the pool so the next batch gets a new one
+            for inp, out in pending_jobs:
+                completed += 1
+                failure = {'file': inp, 'error': 'worker pool broken'}
+                failures.append(failure)
+                if on_progress:
+                    on_progress(completed, total, failure)
+            self.close(wait=False)
 
         elapsed = time.time() - start_time
-        return self._build_summary(results, failures, elapsed)
-
-    def _compress_one(self, input_path: Path, output_path: Path) -> Dict:
-        result = self.packager.compress_with_retry(
-            str(input_path),
-            str(output_path),
-            compression_level=self.compression_level,
-            on_progress=None,
-            max_retries=self.max_retries,
-            retry_delay=self.retry_delay
+        return self._build_summary(results, failures, elapsed, total_original, total_compressed)
+
+    def _submit(self, executor, inp: str, out: str):
+        if self.use_processes:
+            return executor.submit(
+                _compress_in_worker, inp, out,
+                self.compression_level, self.max_retries, self.retry_delay
+            )
+        return executor.submit(self._compress_one, inp, out)
+
+    def _record(
+        self,
+        future,
+        inp: str,
+        completed: int,
+        total: int,
+        results: List[Dict],
+        failures: List[Dict],
+        on_progress: Optional[Callable],
+        log_q: queue.SimpleQueue
+    ) -> Optional[Dict]:
+        """Queue one finished job's log line and file it under results or failures. Returns the result on success."""
+        try:
+            result = future.result()
+            results.append(result)
+
+            if on_progress:
+                on_progress(completed, total, result)
+
+            log_q.put((logging.INFO, self.PROGRESS_TEMPLATE, (
+                completed, total, os.path.basename(inp), result['space_saved_percent']
+            )))
+            return result
+
+        except Exception as e:
+            failure = {
+                'file': inp,
+                'error': str(e)
+            }
+            failures.append(failure)
+
+            if on_progress:
+                on_progress(completed, total, failure)
+
+            log_q.put((logging.ERROR, self.FAILURE_TEMPLATE, (completed, total, os.path.basename(inp), e)))
+            return None
+
+    @staticmethod
+    def _drain_log(log_q: queue.SimpleQueue) -> None:
+        """Write queued progress lines until the None sentinel arrives."""
+        while True:
+            item = log_q.get()
+            if item is None:
+                return
+            level, template, args = item
+            logger.log(level, template.format(*args))
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_worker_init,
+                    initargs=(str(self.packager.dict_path), self.max_file_size_mb)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _compress_one(self, input_path: str, output_path: str) -> Dict:
+        return _compress_job(
+            self.packager, input_path, output_path,
+            self.compression_level, self.max_retries, self.retry_delay
         )
-        result['input_file'] = str(input_path)
-        return result
 
-    def _build_summary(self, results: List[Dict], failures: List[Dict], elapsed: float) -> Dict:
+    def _build_summary(
+        self,
+        results: List[Dict],
+        failures: List[Dict],
+        elapsed: float,
+        total_original: int,
+        total_compressed: int
+    ) -> Dict:
         total = len(results) + len(failures)
-        total_original = sum(r['original_size'] for r in results)
-        total_compressed = sum(r['compressed_size'] for r in results)
         overall_saving = (
             (1 - total_compressed / total_original) * 100
             if total_original > 0 else 0
@@ -6,15 +6,19 @@ NOT byte-perfect — use only when visual fidelity > exact restoration.
 """
 import os
 import io
-import json
 import time
 import tempfile
-import shutil
-import struct
-import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import zstandard as zstd
+from typing import Optional, Tuple
 from ..utils.logger import logger
+from ..utils import json_codec
+from ..utils.package_header import write_header, patch_manifest
+from ..utils.zstd_contexts import get_compressor, stream_chunk_size
+from ..utils.io_hints import advise_dontneed
+from ..utils.checksum import calculate_file_checksum, new_file_hasher, DEFAULT_FILE_ALGO
 
 try:
     import fitz
@@ -28,6 +32,12 @@ try:
 except ImportError:
     HAS_PIL = False
 
+try:
+    import mozjpeg_lossless_optimization
+    HAS_MOZJPEG = True
+except ImportError:
+    HAS_MOZJPEG = False
+
 
 class LossyPackager:
     """
@@ -46,14 +56,29 @@ class LossyPackager:
     VERSION = 1
     CHUNK_SIZE = 65536
     JPEG_QUALITY = 85  # visually near-identical, meaningfully smaller
-
-    def __init__(self, dict_path: str = None, jpeg_quality: int = 85):
+    # Below this many images, process-pool spawn costs more than it saves
+    PARALLEL_IMAGE_THRESHOLD = 8
+    # Images smaller than this (pixels per side / stored bytes) are left alone
+    MIN_IMAGE_DIM = 100
+    MIN_IMAGE_BYTES = 5 * 1024
+
+    # Same table as Packager — 'ultra' is for archival only
+    COMPRESSION_LEVELS = {
+        'low':    3,
+        'medium': 10,
+        'high':   15,
+        'ultra':  19
+    }
+
+    def __init__(self, dict_path: str = None, jpeg_quality: int = 85, threads: int = -1):
         if dict_path:
             self.dict_path = Path(dict_path)
         else:
             self.dict_path = Path(__file__).parent / 'zypher.dict'
 
         self.jpeg_quality = jpeg_quality
+        # zstd worker threads: -1 = one per core, 0 = single-threaded
+        self.threads = threads
         self._cached_dict = None
         self._load_dictionary()
 
@@ -76,24 +101,24 @@ class LossyPackager:
 
         start_time = time.time()
         tmp_path = None
-        tmp_pdf = None
 
-        LEVELS = {'low': 3, 'medium': 10, 'high': 19, 'ultra': 22}
-        level = LEVELS.get(compression_level, 19)
+        level = self.COMPRESSION_LEVELS.get(compression_level, self.COMPRESSION_LEVELS['high'])
 
         try:
             logger.info(f"📦 Lossy packaging: {input_path} [{compression_level}]")
 
             original_size = os.path.getsize(input_path)
 
-            # Step 1: Recompress images inside the PDF
-            tmp_pdf_fd, tmp_pdf = tempfile.mkstemp(suffix='.pdf')
-            os.close(tmp_pdf_fd)
-
-            recompressed_size = self._recompress_pdf_images(input_path, tmp_pdf)
+            # Step 1: Recompress images inside the PDF — kept in memory, the
+            # only file written is the final package
+            pdf_bytes = self._recompress_pdf_images(input_path)
+            recompressed_size = len(pdf_bytes)
             logger.info(f"   PDF image recompression: {original_size/1024:.1f}KB → {recompressed_size/1024:.1f}KB")
 
-            # Step 2: zstd compress the recompressed PDF
+            # Step 2: zstd compress the recompressed PDF, hashing each slice as
+            # it is fed in (still cache-hot) rather than in a separate pass; the
+            # checksum placeholder is patched once the stream ends
+            hasher = new_file_hasher(DEFAULT_FILE_ALGO)
             manifest = {
                 'original_filename': Path(input_path).name,
                 'original_size': original_size,
@@ -102,20 +127,20 @@ class LossyPackager:
                 'format': 'pdf',
                 'lossy': True,
                 'jpeg_quality': self.jpeg_quality,
-                'checksum': self._checksum_file(tmp_pdf),  # checksum of recompressed version
+                'checksum': '0' * (hasher.digest_size * 2),  # checksum of recompressed version
+                'checksum_algo': DEFAULT_FILE_ALGO,
                 'has_dict': self._cached_dict is not None
             }
-            manifest_bytes = json.dumps(manifest).encode('utf-8')
+            manifest_bytes = json_codec.dumps(manifest)
 
-            # Build compressor
-            params = zstd.ZstdCompressionParameters.from_level(
+            # Compressor reused per thread and parameter set
+            use_ldm = recompressed_size > 1_000_000
+            cctx = get_compressor(
                 level,
-                enable_ldm=1 if recompressed_size > 1_000_000 else 0,
-                ldm_hash_log=20 if recompressed_size > 1_000_000 else 0,
-            )
-            cctx = zstd.ZstdCompressor(
-                compression_params=params,
-                dict_data=self._cached_dict if self._cached_dict else None
+                enable_ldm=use_ldm,
+                dict_data=self._cached_dict,
+                ldm_hash_log=20 if use_ldm else 0,
+                threads=self.threads
             )
 
             tmp_fd, tmp_path = tempfile.mkstemp(
@@ -123,20 +148,31 @@ class LossyPackager:
                 dir=Path(output_path).parent
             )
 
-            with os.fdopen(tmp_fd, 'wb') as out_f:
-                out_f.write(self.MAGIC)
-                out_f.write(struct.pack('>BL', self.VERSION, len(manifest_bytes)))
-                out_f.write(manifest_bytes)
-
-                with cctx.stream_writer(out_f, closefd=False) as compressor:
-                    with open(tmp_pdf, 'rb') as in_f:
-                        while chunk := in_f.read(self.CHUNK_SIZE):
-                            compressor.write(chunk)
-
-            shutil.move(tmp_path, output_path)
+            chunk_size = stream_chunk_size(recompressed_size, multithreaded=self.threads != 0)
+
+            with os.fdopen(tmp_fd, 'wb', buffering=zstd.COMPRESSION_RECOMMENDED_OUTPUT_SIZE) as out_f:
+                manifest_offset = write_header(out_f, self.MAGIC, self.VERSION, manifest_bytes)
+
+                view = memoryview(pdf_bytes)
+                with cctx.stream_writer(
+                    out_f, size=recompressed_size,
+                    write_size=zstd.COMPRESSION_RECOMMENDED_OUTPUT_SIZE, closefd=False
+                ) as compressor:
+                    for offset in range(0, recompressed_size, chunk_size):
+                        chunk = view[offset:offset + chunk_size]
+                        compressor.write(chunk)
+                        hasher.update(chunk)
+                view.release()
+
+                manifest['checksum'] = hasher.hexdigest()
+                final_size = patch_manifest(out_f, manifest_offset, manifest, len(manifest_bytes))
+                out_f.flush()
+                # Single pass: the package isn't reread, keep it out of the page cache
+                advise_dontneed(out_f)
+
+            os.replace(tmp_path, output_path)
             tmp_path = None
 
-            final_size = os.path.getsize(output_path)
             elapsed = time.time() - start_time
             percent = (1 - final_size / original_size) * 100
 
@@ -163,58 +199,155 @@ class LossyPackager:
         finally:
             if tmp_path and os.path.exists(tmp_path):
                 os.remove(tmp_path)
-            if tmp_pdf and os.path.exists(tmp_pdf):
-                os.remove(tmp_pdf)
 
-    def _recompress_pdf_images(self, input_path: str, output_path: str) -> int:
+    def _recompress_pdf_images(self, input_path: str) -> bytes:
         """
         Opens PDF, finds all images, recompresses them at target JPEG quality,
-        replaces them in the PDF, saves. Returns new file size.
+        replaces them in the PDF. Returns the rewritten PDF bytes.
+        Re-encoding runs in a process pool; the document itself is only ever
+        touched from this process.
         """
         doc = fitz.open(input_path)
 
+        # Unique xrefs worth recompressing (a logo on every page is encoded
+        # once), with the first page that shows each one
+        page_of_xref = {}
         for page in doc:
             for img_info in page.get_images(full=True):
                 xref = img_info[0]
-                try:
-                    base_image = doc.extract_image(xref)
-                    image_bytes = base_image['image']
-                    img_ext = base_image['ext'].lower()
-
-                    # Only recompress JPEG and PNG — skip tiny images
-                    width = img_info[2]
-                    height = img_info[3]
-                    if width < 100 or height < 100:
-                        continue
-
-                    with Image.open(io.BytesIO(image_bytes)) as img:
-                        out = io.BytesIO()
-
-                        if img.mode in ('RGBA', 'P'):
-                            img = img.convert('RGB')
-
-                        img.save(out, format='JPEG', quality=self.jpeg_quality, optimize=True)
-                        recompressed = out.getvalue()
-
-                    # Only replace if actually smaller
-                    if len(recompressed) < len(image_bytes):
-                        doc.update_image(xref, stream=recompressed)
+                if xref in page_of_xref:
+                    continue
+                # Skip tiny images, judged from the image dictionary alone so
+                # they are never extracted or decoded
+                width = img_info[2]
+                height = img_info[3]
+                if (width < self.MIN_IMAGE_DIM or height < self.MIN_IMAGE_DIM
+                        or self._stored_size(doc, xref) < self.MIN_IMAGE_BYTES):
+                    page_of_xref[xref] = None
+                    continue
+                page_of_xref[xref] = page.number
+
+        # Drop MuPDF's cached page objects/resources before decoding images
+        fitz.TOOLS.store_shrink(100)
+
+        xrefs = [xref for xref, pno in page_of_xref.items() if pno is not None]
+        for xref, recompressed in self._iter_recompressed(doc, xrefs):
+            # Only replace if actually smaller. replace_image rewrites the
+            # xref itself, so every page showing it picks up the new stream.
+            if recompressed is not None:
+                doc[page_of_xref[xref]].replace_image(xref, stream=recompressed)
+                # Each replaced image leaves decoded copies in the store
+                fitz.TOOLS.store_shrink(100)
+
+        # garbage=4 also merges duplicate streams left by the replacements
+        pdf_bytes = doc.tobytes(deflate=True, garbage=4, clean=True)
+        doc.close()
+        return pdf_bytes
 
-                except Exception as e:
-                    logger.debug(f"Skipping image xref {xref}: {e}")
+    @staticmethod
+    def _stored_size(doc: 'fitz.Document', xref: int) -> float:
+        """Compressed stream length from /Length; inf when it is indirect or unreadable."""
+        try:
+            kind, value = doc.xref_get_key(xref, 'Length')
+            if kind == 'int':
+                return int(value)
+        except Exception:
+            pass
+        return float('inf')
+
+    def _iter_recompressed(self, doc: 'fitz.Document', xrefs: list):
+        """Yield (xref, smaller JPEG or None), keeping at most 2 images per worker in flight."""
+        def read(xref):
+            try:
+                base_image = doc.extract_image(xref)
+                return base_image['image'], base_image['ext'].lower()
+            except Exception as e:
+                logger.debug(f"Skipping image xref {xref}: {e}")
+                return None
+
+        if len(xrefs) < self.PARALLEL_IMAGE_THRESHOLD:
+            for xref in xrefs:
+                if (image := read(xref)) is not None:
+                    yield _recompress_image(xref, *image, self.jpeg_quality)
+            return
+
+        workers = os.cpu_count() or 1
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for xref in xrefs:
+                if (image := read(xref)) is None:
                     continue
+                pending.append(executor.submit(_recompress_image, xref, *image, self.jpeg_quality))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _checksum_file(self, file_path: str, algo: str = 'sha256') -> str:
+        return calculate_file_checksum(file_path, algo)
+
+
+# IJG reference luminance table (quality 50); libjpeg scales it per quality
+_IJG_LUMA_TABLE_SUM = sum((
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+))
+# Sources estimated within this many points of the target are not re-encoded
+JPEG_QUALITY_SLACK = 5
+
+
+def _estimate_jpeg_quality(img: 'Image.Image') -> Optional[int]:
+    """Approximate libjpeg quality from the luminance quantization table (header only, no decode)."""
+    tables = getattr(img, 'quantization', None)
+    if not tables or 0 not in tables:
+        return None
+    scale = sum(tables[0]) * 100 / _IJG_LUMA_TABLE_SUM
+    quality = (200 - scale) / 2 if scale <= 100 else 5000 / scale
+    return max(1, min(100, round(quality)))
+
+
+def _optimize_jpeg(xref: int, data: bytes) -> bytes:
+    """Lossless mozjpeg pass when installed — same pixels, rebuilt Huffman tables and scans."""
+    if not HAS_MOZJPEG:
+        return data
+    try:
+        optimized = mozjpeg_lossless_optimization.optimize(data)
+        if len(optimized) < len(data):
+            return optimized
+    except Exception as e:
+        logger.debug(f"mozjpeg optimization failed for xref {xref}: {e}")
+    return data
+
+
+def _recompress_image(xref: int, image_bytes: bytes, ext: str, quality: int) -> Tuple[int, Optional[bytes]]:
+    """Process-pool entry point — re-encode one image, None unless it got smaller."""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            source_quality = _estimate_jpeg_quality(img) if ext in ('jpeg', 'jpg') else None
+            if source_quality is not None and source_quality <= quality + JPEG_QUALITY_SLACK:
+                # Already a JPEG at (or below) the target quality: decoding and
+                # re-encoding would only add generational loss
+                recompressed = _optimize_jpeg(xref, image_bytes)
+                return xref, recompressed if len(recompressed) < len(image_bytes) else None
+
+            out = io.BytesIO()
+
+            if img.mode in ('RGBA', 'P'):
+                img = img.convert('RGB')
+
+            img.save(
+                out, format='JPEG', quality=quality, optimize=True,
+                progressive=True, subsampling='4:2:0'
+            )
+            recompressed = out.getvalue()
+    except Exception as e:
+        logger.debug(f"Skipping image xref {xref}: {e}")
+        return xref, None
 
-        doc.save(output_path, deflate=True, garbage=3)
-        size = os.path.getsize(output_path)
-        doc.close()
-        return size
-
-    def _checksum_file(self, file_path: str) -> str:
-        sha256 = hashlib.sha256()
-        with open(file_path, 'rb') as f:
-            while chunk := f.read(self.CHUNK_SIZE):
-                sha256.update(chunk)
-        return sha256.hexdigest()
+    recompressed = _optimize_jpeg(xref, recompressed)
+    return xref, recompressed if len(recompressed) < len(image_bytes) else None
 
 
 __all__ = ["LossyPackager"]
\ No newline at end of file
@@ -46,6 +46,7 @@ Standardizes the .zpkg metadata structure
 """
 import time
 from typing import List, Dict, Any
+from ..utils import json_codec
 
 
 class ZypherManifest:
@@ -75,17 +76,14 @@ class ZypherManifest:
         }
     
     def save_manifest(self, manifest: Dict, path: str):
-        import json
-        # FIX: Added encoding='utf-8' and ensure_ascii=False for international chars
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(manifest, f, ensure_ascii=False)
+        # UTF-8 JSON bytes, international chars unescaped (orjson when available)
+        with open(path, 'wb') as f:
+            f.write(json_codec.dumps(manifest))
     
     def load_manifest(self, manifest_path: str) -> Dict:
         """Load manifest from JSON file"""
-        import json
-        # FIX: Added encoding='utf-8' for Windows compatibility
-        with open(manifest_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(manifest_path, 'rb') as f:
+            return json_codec.loads(f.read())
     
     def add_chunk(
         self,
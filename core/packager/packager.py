@@ -4,17 +4,19 @@ Lossless compression using zstd streaming.
 Dictionary cached in memory, LDM for large files.
 """
 import os
-import json
+import mmap
 import time
 import tempfile
-import shutil
-import struct
-import hashlib
 from pathlib import Path
 import zstandard as zstd
 from ..utils.logger import logger
+from ..utils import json_codec
+from ..utils.package_header import write_header, patch_manifest
+from ..utils.io_hints import advise_sequential, advise_dontneed
+from ..utils.checksum import HashingReader, calculate_file_checksum, new_file_hasher, DEFAULT_FILE_ALGO
 from typing import Optional, Callable
 from ..config import config
+from ..utils.zstd_contexts import get_compressor, stream_chunk_size
 
 class Packager:
     SUPPORTED_FORMATS = {
@@ -22,21 +24,37 @@ class Packager:
         '.tiff', '.docx', '.xlsx', '.pptx', '.txt', '.csv'
     }
 
+    # Levels above 15 switch zstd to the btopt/btultra matchfinders: several
+    # times slower for a few percent. 'ultra' is meant for archival only.
     COMPRESSION_LEVELS = {
         'low':    3,
         'medium': 10,
-        'high':   19,
-        'ultra':  22
+        'high':   15,
+        'ultra':  19
     }
 
     MAGIC = b'ZPKG'
-    VERSION = 1
+    # v2: header wrapped in a zstd skippable frame (see utils.package_header)
+    VERSION = 2
     CHUNK_SIZE = 65536          # 64KB read chunks
+    # Inputs below this are memory-mapped instead of read into buffers
+    MMAP_MAX_SIZE = 256 * 1024 * 1024
+    # Already-compressed inputs are packed at level 1 — higher levels only burn
+    # CPU. Known container formats are demoted by extension; anything else
+    # whose first 64KB won't shrink below 95% at level 1 is demoted too.
+    # Inputs under PROBE_MIN_SIZE skip the probe: frame overhead alone can
+    # push a tiny file's ratio past the threshold.
+    COMPRESSED_FORMATS = frozenset({'.jpg', '.jpeg', '.png', '.docx', '.xlsx', '.pptx'})
+    PROBE_SIZE = 65536
+    PROBE_MIN_SIZE = 4096
+    INCOMPRESSIBLE_RATIO = 0.95
+    INCOMPRESSIBLE_LEVEL = 1
     MAX_TRAINING_FILE_SIZE = 102400  # 100KB max for dict training samples
+    TRAINING_SAMPLE_RATIO = 100      # stop collecting samples at 100x the dict size
     # At class level
     MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB default — adjust to your server limits
 
-    def __init__(self, dict_path: str = None, max_file_size_mb: int = 500):
+    def __init__(self, dict_path: str = None, max_file_size_mb: int = 500, threads: int = -1):
         # Fix #3: accept absolute path, don't rely on cwd
         if dict_path:
             self.dict_path = Path(dict_path)
@@ -45,10 +63,11 @@ class Packager:
             self.dict_path = Path(__file__).parent / 'zypher.dict'
 
         self.MAX_FILE_SIZE = max_file_size_mb * 1024 * 1024
+        # zstd worker threads: -1 = one per core, 0 = single-threaded
+        self.threads = threads
 
         # Fix #1: load dictionary once into memory at init
         self._cached_dict = None
-        self._cached_decompressor_dict = None
         self._load_dictionary()
 
     def _load_dictionary(self):
@@ -58,19 +77,10 @@ class Packager:
                 with open(self.dict_path, 'rb') as f:
                     dict_data = f.read()
                 self._cached_dict = zstd.ZstdCompressionDict(dict_data)
-                self._cached_decompressor_dict = zstd.ZstdCompressionDict(dict_data)
                 logger.info(f"Loaded zstd dictionary into memory ({len(dict_data)/1024:.1f} KB)")
             except Exception as e:
                 logger.warning(f"Failed to load dictionary: {e}")
 
-    def _get_chunk_size(self, file_size: int) -> int:
-        if file_size < 10_000_000:      # < 10MB
-            return 65536                 # 64KB
-        elif file_size < 100_000_000:   # < 100MB
-            return 524288                # 512KB
-        else:                           # > 100MB
-            return 1048576               # 1MB
-
     def compress_file(self, input_path: str, output_path: str, compression_level: str = 'high', on_progress: Optional[Callable] = None) -> dict:
         start_time = time.time()
         tmp_path = None
@@ -93,8 +103,14 @@ class Packager:
                     f"limit of {self.MAX_FILE_SIZE/1024/1024:.0f}MB"
                 )
 
-            checksum = self._checksum_file(input_path)
-            level = self.COMPRESSION_LEVELS.get(compression_level, 19)
+            # The input is hashed as it streams into the compressor (one read
+            # instead of two); the manifest carries a same-length placeholder
+            # that is patched in place once the digest is known
+            hasher = new_file_hasher(DEFAULT_FILE_ALGO)
+            level = self.COMPRESSION_LEVELS.get(compression_level, self.COMPRESSION_LEVELS['high'])
+            if level > self.INCOMPRESSIBLE_LEVEL and self._is_incompressible(input_path, ext, original_size):
+                logger.info(f"   Input looks already compressed — using zstd level {self.INCOMPRESSIBLE_LEVEL}")
+                level = self.INCOMPRESSIBLE_LEVEL
             cctx = self._build_compressor(level, original_size, track_progress=on_progress is not None)
 
             manifest = {
@@ -102,20 +118,19 @@ class Packager:
                 'original_size': original_size,
                 'compression_level': compression_level,
                 'format': ext.lstrip('.'),
-                'checksum': checksum,
+                'checksum': '0' * (hasher.digest_size * 2),
+                'checksum_algo': DEFAULT_FILE_ALGO,
                 'has_dict': self._cached_dict is not None
             }
-            manifest_bytes = json.dumps(manifest).encode('utf-8')
+            manifest_bytes = json_codec.dumps(manifest)
 
             tmp_fd, tmp_path = tempfile.mkstemp(
                 suffix='.zpkg.tmp',
                 dir=Path(output_path).parent
             )
 
-            with os.fdopen(tmp_fd, 'wb') as out_f:
-                out_f.write(self.MAGIC)
-                out_f.write(struct.pack('>BL', self.VERSION, len(manifest_bytes)))
-                out_f.write(manifest_bytes)
+            with os.fdopen(tmp_fd, 'wb', buffering=zstd.COMPRESSION_RECOMMENDED_OUTPUT_SIZE) as out_f:
+                manifest_offset = write_header(out_f, self.MAGIC, self.VERSION, manifest_bytes, skippable=True)
 
                 #with cctx.stream_writer(out_f, closefd=False) as compressor:
                     #with open(input_path, 'rb') as in_f:
@@ -123,20 +138,34 @@ class Packager:
                             #compressor.write(chunk)
 
                 # AFTER
-                chunk_size = self._get_chunk_size(original_size)
-                with cctx.stream_writer(out_f, closefd=False) as compressor:
-                    with open(input_path, 'rb') as in_f:
-                        bytes_read = 0
-                        while chunk := in_f.read(chunk_size):
-                            compressor.write(chunk)
-                            bytes_read += len(chunk)
-                            if on_progress:
-                                on_progress(bytes_read, original_size)
-
-            shutil.move(tmp_path, output_path)
+                chunk_size = stream_chunk_size(original_size, multithreaded=self.threads != 0 and on_progress is None)
+                with open(input_path, 'rb') as in_f:
+                    advise_sequential(in_f)
+                    if original_size < self.MMAP_MAX_SIZE:
+                        self._compress_mapped(cctx, in_f, out_f, hasher, original_size, chunk_size, on_progress)
+                    else:
+                        # copy_stream drives the read/compress/write loop from C; the
+                        # reader wrapper only hashes and reports progress per chunk
+                        cctx.copy_stream(
+                            HashingReader(in_f, hasher, on_progress, original_size),
+                            out_f,
+                            size=original_size,
+                            read_size=chunk_size,
+                            write_size=zstd.COMPRESSION_RECOMMENDED_OUTPUT_SIZE
+                        )
+                    # Single pass: keep neither input nor output in the page cache
+                    advise_dontneed(in_f)
+
+                manifest['checksum'] = hasher.hexdigest()
+                patch_manifest(out_f, manifest_offset, manifest, len(manifest_bytes))
+                # Patching leaves the position at EOF — that is the archive size
+                final_size = out_f.tell()
+                out_f.flush()
+                advise_dontneed(out_f)
+
+            os.replace(tmp_path, output_path)
             tmp_path = None
 
-            final_size = os.path.getsize(output_path)
             elapsed = time.time() - start_time
             percent = (1 - final_size / original_size) * 100
 
@@ -164,22 +193,18 @@ class Packager:
                 os.remove(tmp_path)
 
     def _build_compressor(self, level: int, file_size: int, track_progress: bool = False) -> zstd.ZstdCompressor:
-        """Build compressor with LDM for large files, cached dict if available"""
+        """Compressor with LDM for large files and the cached dict if available.
+        Reused per thread and parameter set, with the dictionary digested once."""
         use_ldm = file_size > 1_000_000
 
-        params = zstd.ZstdCompressionParameters.from_level(
+        return get_compressor(
             level,
-            enable_ldm=1 if use_ldm else 0,
+            enable_ldm=use_ldm,
+            dict_data=self._cached_dict,
             ldm_hash_log=20 if use_ldm else 0,
-            threads=-1 if not track_progress else 0
+            threads=self.threads if not track_progress else 0
         )
 
-        if self._cached_dict:
-            return zstd.ZstdCompressor(compression_params=params, dict_data=self._cached_dict)
-
-        return zstd.ZstdCompressor(compression_params=params)
-
-
     def compress_with_retry(
         self,
         input_path: str,
@@ -233,7 +258,8 @@ class Packager:
         """
         Train a zstd dictionary on sample files.
         Only uses files under 100KB — larger files don't benefit from dictionaries
-        and waste RAM during training.
+        and waste RAM during training. Collection stops once the samples add up
+        to ~100x the dictionary size, zstd's recommended training volume.
         """
         if not sample_files:
             raise ValueError("No sample files provided for training")
@@ -242,10 +268,14 @@ class Packager:
         samples = []
         total_size = 0
         skipped = 0
+        sample_budget = dict_size_kb * 1024 * self.TRAINING_SAMPLE_RATIO
 
         logger.info(f"Training dictionary on up to {len(sample_files)} files...")
 
         for file_path in sample_files:
+            if total_size >= sample_budget:
+                logger.info(f"  Sample budget of {sample_budget/1024:.0f} KB reached, ignoring remaining files")
+                break
             try:
                 # Fix #2: skip large files — dict training only helps small files
                 size = os.path.getsize(file_path)
@@ -291,13 +321,45 @@ class Packager:
 
         return output_path
 
-    def _checksum_file(self, file_path: str) -> str:
-        """Compute SHA-256 without loading into RAM"""
-        sha256 = hashlib.sha256()
-        with open(file_path, 'rb') as f:
-            while chunk := f.read(self.CHUNK_SIZE):
-                sha256.update(chunk)
-        return sha256.hexdigest()
+    def _is_incompressible(self, input_path: str, ext: str, size: int) -> bool:
+        """Known compressed format, or a quick level-1 trial on the file's head that barely shrinks."""
+        if ext in self.COMPRESSED_FORMATS:
+            return True
+        if size < self.PROBE_MIN_SIZE:
+            return False
+        with open(input_path, 'rb') as f:
+            head = f.read(self.PROBE_SIZE)
+        probe = get_compressor(1, threads=0).compress(head)
+        return len(probe) > len(head) * self.INCOMPRESSIBLE_RATIO
+
+    @staticmethod
+    def _compress_mapped(cctx, in_f, out_f, hasher, size: int, chunk_size: int, on_progress: Optional[Callable]):
+        """
+        Feed the compressor and hasher memoryview slices of a read-only mapping
+        of the input — no userspace copy of the data per chunk.
+        """
+        with mmap.mmap(in_f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mm)
+            try:
+                with cctx.stream_writer(
+                    out_f, size=size, write_size=zstd.COMPRESSION_RECOMMENDED_OUTPUT_SIZE, closefd=False
+                ) as compressor:
+                    for offset in range(0, size, chunk_size):
+                        chunk = view[offset:offset + chunk_size]
+                        compressor.write(chunk)
+                        hasher.update(chunk)
+                        chunk.release()
+                        if on_progress:
+                            on_progress(min(offset + chunk_size, size), size)
+            finally:
+                # The mapping can't close while a view still references it
+                view.release()
+
+    def _checksum_file(self, file_path: str, algo: str = 'sha256') -> str:
+        """Compute the file checksum without loading into RAM"""
+        return calculate_file_checksum(file_path, algo)
 
 
 __all__ = ["Packager"]
\ No newline at end of file
@@ -7,15 +7,15 @@ Do NOT use for: signed PDFs, medical imaging, legal originals.
 """
 import os
 import io
-import json
 import time
 import tempfile
-import shutil
-import struct
-import hashlib
 from pathlib import Path
 import zstandard as zstd
 from ..utils.logger import logger
+from ..utils import json_codec
+from ..utils.package_header import write_header, patch_manifest
+from ..utils.zstd_contexts import get_compressor, stream_chunk_size
+from ..utils.checksum import calculate_file_checksum, new_file_hasher, DEFAULT_FILE_ALGO
 from ..config import config
 
 try:
@@ -38,11 +38,13 @@ class VisualPackager:
 
     SUPPORTED_FORMATS = {'.pdf'}  # visual mode PDF only for now
 
+    # Levels above 15 switch zstd to the btopt/btultra matchfinders: several
+    # times slower for a few percent. 'ultra' is meant for archival only.
     COMPRESSION_LEVELS = {
         'low':    3,
         'medium': 10,
-        'high':   19,
-        'ultra':  22
+        'high':   15,
+        'ultra':  19
     }
 
     def __init__(
@@ -78,7 +80,6 @@ class VisualPackager:
     ) -> dict:
         start_time = time.time()
         tmp_path = None
-        tmp_pdf_path = None
 
         try:
             ext = Path(input_path).suffix.lower()
@@ -162,29 +163,24 @@ class VisualPackager:
                 f"{len(processed_bytes)/1024:.1f}KB"
             )
 
-            # Write processed PDF to temp file for streaming
-            tmp_pdf_fd, tmp_pdf_path = tempfile.mkstemp(suffix='.pdf')
-            with os.fdopen(tmp_pdf_fd, 'wb') as f:
-                f.write(processed_bytes)
             processed_size = len(processed_bytes)
 
             # Step 5: zstd compress the processed PDF
-            level = self.COMPRESSION_LEVELS.get(compression_level, 19)
+            level = self.COMPRESSION_LEVELS.get(compression_level, self.COMPRESSION_LEVELS['high'])
             use_ldm = processed_size > 1_000_000
-            params = zstd.ZstdCompressionParameters.from_level(
+            cctx = get_compressor(
                 level,
-                enable_ldm=1 if use_ldm else 0,
+                enable_ldm=use_ldm,
+                dict_data=self._cached_dict,
                 ldm_hash_log=20 if use_ldm else 0,
                 threads=0 if on_progress else -1
             )
-            cctx = zstd.ZstdCompressor(
-                compression_params=params,
-                dict_data=self._cached_dict if self._cached_dict else None
-            )
 
             # Checksum of processed bytes — not original
-            # (we store what we can restore, not the original bytes)
-            checksum = hashlib.sha256(processed_bytes).hexdigest()
+            # (we store what we can restore, not the original bytes). Each
+            # slice is hashed as it is fed to zstd, while still cache-hot; the
+            # placeholder is patched once the stream ends
+            hasher = new_file_hasher(DEFAULT_FILE_ALGO)
 
             manifest = {
                 'original_filename': Path(input_path).name,
@@ -194,10 +190,11 @@ class VisualPackager:
                 'format': 'pdf',
                 'mode': 'visual',
                 'jpeg_quality': self.jpeg_quality,
-                'checksum': checksum,
+                'checksum': '0' * (hasher.digest_size * 2),
+                'checksum_algo': DEFAULT_FILE_ALGO,
                 'has_dict': self._cached_dict is not None
             }
-            manifest_bytes = json.dumps(manifest).encode('utf-8')
+            manifest_bytes = json_codec.dumps(manifest)
 
             # Atomic write
             tmp_fd, tmp_path = tempfile.mkstemp(
@@ -205,23 +202,27 @@ class VisualPackager:
                 dir=Path(output_path).parent
             )
 
-            chunk_size = self._get_chunk_size(processed_size)
+            chunk_size = stream_chunk_size(processed_size, multithreaded=on_progress is None)
+
+            with os.fdopen(tmp_fd, 'wb', buffering=zstd.COMPRESSION_RECOMMENDED_OUTPUT_SIZE) as out_f:
+                manifest_offset = write_header(out_f, self.MAGIC, self.VERSION, manifest_bytes)
 
-            with os.fdopen(tmp_fd, 'wb') as out_f:
-                out_f.write(self.MAGIC)
-                out_f.write(struct.pack('>BL', self.VERSION, len(manifest_bytes)))
-                out_f.write(manifest_bytes)
+                # The processed PDF is already in memory — feed slices of it
+                # straight to zstd instead of round-tripping through a temp file
+                view = memoryview(processed_bytes)
+                with cctx.stream_writer(out_f, size=processed_size, closefd=False) as compressor:
+                    for offset in range(0, processed_size, chunk_size):
+                        chunk = view[offset:offset + chunk_size]
+                        compressor.write(chunk)
+                        hasher.update(chunk)
+                        if on_progress:
+                            on_progress(min(offset + chunk_size, processed_size), processed_size)
+                view.release()
 
-                with cctx.stream_writer(out_f, closefd=False) as compressor:
-                    with open(tmp_pdf_path, 'rb') as in_f:
-                        bytes_read = 0
-                        while chunk := in_f.read(chunk_size):
-                            compressor.write(chunk)
-                            bytes_read += len(chunk)
-                            if on_progress:
-                                on_progress(bytes_read, processed_size)
+                manifest['checksum'] = hasher.hexdigest()
+                patch_manifest(out_f, manifest_offset, manifest, len(manifest_bytes))
 
-            shutil.move(tmp_path, output_path)
+            os.replace(tmp_path, output_path)
             tmp_path = None
 
             final_size = os.path.getsize(output_path)
@@ -251,8 +252,6 @@ class VisualPackager:
         finally:
             if tmp_path and os.path.exists(tmp_path):
                 os.remove(tmp_path)
-            if tmp_pdf_path and os.path.exists(tmp_pdf_path):
-                os.remove(tmp_pdf_path)
 
     def _is_signed(self, doc: fitz.Document) -> bool:
         """Detect digital signatures — modifying signed PDFs breaks them"""
@@ -334,20 +333,8 @@ class VisualPackager:
 
         logger.info(f"   Images replaced: {replaced}, skipped: {skipped}")
 
-    def _get_chunk_size(self, file_size: int) -> int:
-        if file_size < 10_000_000:
-            return 65536
-        elif file_size < 100_000_000:
-            return 524288
-        else:
-            return 1048576
-
-    def _checksum_file(self, file_path: str) -> str:
-        sha256 = hashlib.sha256()
-        with open(file_path, 'rb') as f:
-            while chunk := f.read(self.CHUNK_SIZE):
-                sha256.update(chunk)
-        return sha256.hexdigest()
+    def _checksum_file(self, file_path: str, algo: str = 'sha256') -> str:
+        return calculate_file_checksum(file_path, algo)
 
 
 __all__ = ["VisualPackager"]
\ No newline at end of file
@@ -11,9 +11,22 @@ Fixes:
 
 import fitz
 import json
-import zstandard as zstd
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from ..utils.logger import logger
+from ..compressor.metadata_compressor import MetadataCompressor
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _json_loads(raw):
+    """Parse JSON from bytes or str (orjson when available, no decode copy)."""
+    if HAS_ORJSON:
+        return orjson.loads(raw)
+    return json.loads(raw)
 
 
 class PDFRebuilder:
@@ -47,6 +60,25 @@ class PDFRebuilder:
     
     }
 
+    _metadata = None
+
+    def _decode_chunk(self, raw: bytes) -> Any:
+        """
+        Decompress a vector/font chunk. MetadataCompressor sniffs JSON vs
+        MessagePack payloads and applies the layout dictionary when needed.
+        """
+        if self._metadata is None:
+            self._metadata = MetadataCompressor()
+        try:
+            return self._metadata.decompress(raw)
+        except Exception as e:
+            # Chunk stored without zstd, or in a form MetadataCompressor
+            # doesn't recognise — try it as plain JSON before giving up
+            try:
+                return _json_loads(raw)
+            except ValueError:
+                raise e
+
     def rebuild(self, chunks: List[Dict], output_path: str, manifest: Dict, package_path: str = None) -> None:
         try:
             logger.info(f"Rebuilding: {output_path}")
@@ -58,6 +90,11 @@ class PDFRebuilder:
                 return
             img_map = {c['id']: c for c in chunks if c['type'] == 'image'}
             vec_map = {c['id']: c for c in chunks if c['type'] == 'vectors'}
+            # Columnar layouts keep pages under 'pages' with a shared font table
+            layout_fonts = layout.get('fonts', [])
+            scales = (layout.get('coord_scale', 1), layout.get('size_scale', 1))
+            if 'pages' in layout:
+                layout = layout['pages']
             font_buffers = {}
             if not self.SAFE_MODE:
                 font_buffers = self._load_fonts(chunks)
@@ -81,7 +118,7 @@ class PDFRebuilder:
                         None
                     ):
                         self._draw_vectors(page, v_chunk)
-                    self._draw_text(page, p_data.get('blocks', []), font_buffers, p_data.get('height', 792))
+                    self._draw_text(page, self._page_spans(p_data, layout_fonts, scales), font_buffers, p_data.get('height', 792))
                     self._draw_images(page, p_num, img_map)
             
             doc.save(output_path, deflate=True)
@@ -124,16 +161,15 @@ class PDFRebuilder:
 
         if font_chunk:
             try:
-                dctx = zstd.ZstdDecompressor()
-                f_json_bytes = dctx.decompress(font_chunk['data'])
-                font_data_map = json.loads(f_json_bytes.decode('utf-8'))
+                font_data_map = self._decode_chunk(font_chunk['data'])
 
                 if isinstance(font_data_map, str):
-                    font_data_map = json.loads(font_data_map)
+                    font_data_map = _json_loads(font_data_map)
 
-                for name, hex_data in font_data_map.items():
+                for name, font_data in font_data_map.items():
                     try:
-                        font_buffers[name] = bytes.fromhex(hex_data)
+                        # Raw bytes from binary serializers, hex from JSON
+                        font_buffers[name] = font_data if isinstance(font_data, bytes) else bytes.fromhex(font_data)
                         if '+' in name:
                             font_buffers[name.split('+')[1]] = font_buffers[name]
                     except ValueError as e:
@@ -197,7 +233,31 @@ class PDFRebuilder:
         if is_italic:             return 'heit'
         return 'helv'
 
-    def _draw_text(self, page: fitz.Page, blocks: List, font_buffers: Dict, page_height: float = 792):
+    @staticmethod
+    def _page_spans(p_data: Dict, fonts: List[str], scales: tuple = (1, 1)) -> Iterator[Dict]:
+        """
+        Yield span dicts row by row from the columnar page layout — only one
+        row is materialized at a time. Older layouts carry a flat 'blocks' list.
+        Fixed-point coordinates and sizes are scaled back to points.
+        """
+        if 'text' not in p_data:
+            yield from p_data.get('blocks', [])
+            return
+        coord_scale, size_scale = scales
+        for text, x, y, font_id, size, flags in zip(
+            p_data['text'], p_data['x'], p_data['y'],
+            p_data['font'], p_data['size'], p_data['flags']
+        ):
+            yield {
+                'text': text,
+                'x': x / coord_scale,
+                'y': y / coord_scale,
+                'font': fonts[font_id],
+                'size': size / size_scale,
+                'flags': flags
+            }
+
+    def _draw_text(self, page: fitz.Page, blocks: Iterable[Dict], font_buffers: Dict, page_height: float = 792):
         
         logger.info(f"Available font_buffers keys: {list(font_buffers.keys())[:5]}")
         #logger.warning(f"_draw_text called: {len(blocks)} blocks, page_height={page_height}")
@@ -287,12 +347,7 @@ class PDFRebuilder:
         try:
             raw = v_chunk.get('data', b'')
             if isinstance(raw, bytes):
-                try:
-                    dctx = zstd.ZstdDecompressor()
-                    v_json = dctx.decompress(raw)
-                except Exception:
-                    v_json = raw
-                vectors = json.loads(v_json)
+                vectors = self._decode_chunk(raw)
             else:
                 vectors = raw
 
@@ -2,11 +2,10 @@
 Zypher Archive Inspector
 Peek inside a .zpkg archive without decompressing.
 """
-import json
-import struct
 from pathlib import Path
 from datetime import datetime
 from ..utils.logger import logger
+from ..utils.package_header import read_header
 
 
 class Inspector:
@@ -27,13 +26,11 @@ class Inspector:
 
         with open(package_path, 'rb') as f:
             # Read header
-            magic = f.read(4)
-            if magic not in self.MAGIC_MAP:
+            try:
+                magic, version, manifest = read_header(f, self.MAGIC_MAP)
+            except ValueError:
                 raise ValueError(f"Not a valid Zypher archive")
 
-            version, manifest_len = struct.unpack('>BL', f.read(5))
-            manifest = json.loads(f.read(manifest_len).decode('utf-8'))
-
         mode = self.MAGIC_MAP[magic]
         original_size = manifest.get('original_size', 0)
         saving = (1 - archive_size / original_size) * 100 if original_size > 0 else 0
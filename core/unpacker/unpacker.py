@@ -4,15 +4,13 @@ Streaming decompression with integrity verification.
 Dictionary cached in memory at init.
 """
 import os
-import json
 import time
-import struct
 import tempfile
-import shutil
-import hashlib
 from pathlib import Path
 import zstandard as zstd
 from ..utils.logger import logger
+from ..utils.package_header import read_header
+from ..utils.checksum import calculate_file_checksum
 
 
 class Unpacker:
@@ -46,12 +44,10 @@ class Unpacker:
             logger.info(f"🔓 Unpacking: {package_path}")
 
             with open(package_path, 'rb') as f:
-                magic = f.read(4)
-                if magic not in {b'ZPKG', b'ZPKV'}:
-                    raise ValueError(f"Invalid .zpkg file — bad magic bytes")
-
-                version, manifest_len = struct.unpack('>BL', f.read(5))
-                manifest = json.loads(f.read(manifest_len).decode('utf-8'))
+                try:
+                    magic, version, manifest = read_header(f, {b'ZPKG', b'ZPKV'})
+                except ValueError as e:
+                    raise ValueError(f"Invalid .zpkg file — {e}")
 
                 out_dir = Path(output_dir)
                 out_dir.mkdir(parents=True, exist_ok=True)
@@ -68,7 +64,8 @@ class Unpacker:
             # Verify checksum
             stored_checksum = manifest.get('checksum')
             if stored_checksum:
-                actual_checksum = self._checksum_file(tmp_path)
+                # Archives without checksum_algo predate it and used SHA-256
+                actual_checksum = self._checksum_file(tmp_path, manifest.get('checksum_algo', 'sha256'))
                 if actual_checksum != stored_checksum:
                     raise ValueError("Checksum mismatch — file corrupted or tampered with")
                 logger.info(f"✅ Integrity verified")
@@ -81,7 +78,7 @@ class Unpacker:
 
             # Move to final path — only once
             final_path = out_dir / manifest['original_filename']
-            shutil.move(tmp_path, final_path)
+            os.replace(tmp_path, final_path)
             tmp_path = None
 
             logger.info(f"✅ Restored: {final_path}")
@@ -133,13 +130,9 @@ class Unpacker:
         except Exception as e:
             logger.warning(f"Failed to recompress PDF streams: {e}")
 
-    def _checksum_file(self, file_path: str) -> str:
-        """Compute SHA-256 without loading into RAM"""
-        sha256 = hashlib.sha256()
-        with open(file_path, 'rb') as f:
-            while chunk := f.read(self.CHUNK_SIZE):
-                sha256.update(chunk)
-        return sha256.hexdigest()
+    def _checksum_file(self, file_path: str, algo: str = 'sha256') -> str:
+        """Compute the file checksum without loading into RAM"""
+        return calculate_file_checksum(file_path, algo)
 
 
 __all__ = ["Unpacker"]
\ No newline at end of file
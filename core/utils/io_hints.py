@@ -0,0 +1,32 @@
+"""
+Zypher I/O Hints
+Page-cache advice for single-pass streams (no-ops where posix_fadvise is missing).
+Packaging reads each input once and never rereads its output, so those pages
+should get aggressive readahead and then leave the cache to other workloads.
+"""
+import os
+
+HAS_FADVISE = hasattr(os, 'posix_fadvise')
+
+
+def _advise(fileobj, advice_name: str) -> None:
+    if not HAS_FADVISE:
+        return
+    try:
+        os.posix_fadvise(fileobj.fileno(), 0, 0, getattr(os, advice_name))
+    except (OSError, AttributeError, ValueError):
+        # Advisory only — unsupported filesystems/objects just skip it
+        pass
+
+
+def advise_sequential(fileobj) -> None:
+    """Ask the kernel for aggressive readahead on a file read front to back."""
+    _advise(fileobj, 'POSIX_FADV_SEQUENTIAL')
+
+
+def advise_dontneed(fileobj) -> None:
+    """Drop the file's cached pages (dirty pages are queued for writeback first)."""
+    _advise(fileobj, 'POSIX_FADV_DONTNEED')
+
+
+__all__ = ["advise_sequential", "advise_dontneed", "HAS_FADVISE"]
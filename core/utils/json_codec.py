@@ -0,0 +1,31 @@
+"""
+Zypher JSON Codec
+Compact JSON for package headers and manifests — orjson (C) when installed,
+stdlib json otherwise. Both produce plain UTF-8 JSON, so either can read
+what the other wrote.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def dumps(data: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes."""
+    if HAS_ORJSON:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads(raw: Union[bytes, str]) -> Any:
+    """Parse JSON from bytes or str."""
+    if HAS_ORJSON:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+__all__ = ["dumps", "loads", "HAS_ORJSON"]
@@ -0,0 +1,73 @@
+"""
+Zypher Package Header
+MAGIC + struct('>BL', version, manifest_len) + JSON manifest, followed by the
+zstd stream. From version 2 the lossless header sits inside a zstd skippable
+frame, so the whole .zpkg is also a valid zstd stream (`zstd -d` restores the
+original file and ignores the manifest).
+"""
+import os
+import struct
+from typing import BinaryIO, Container, Dict, Tuple
+from . import json_codec
+
+# Skippable frames use magics 0x184D2A50..0x184D2A5F, little-endian, then a u32 size
+SKIPPABLE_FRAME_MAGIC = 0x184D2A50
+_SKIPPABLE_PREFIX = struct.pack('<I', SKIPPABLE_FRAME_MAGIC)
+
+
+def write_header(out_f: BinaryIO, magic: bytes, version: int, manifest_bytes: bytes, skippable: bool = False) -> int:
+    """Write the package header. Returns the manifest's file offset (for in-place patching)."""
+    header = magic + struct.pack('>BL', version, len(manifest_bytes))
+    if skippable:
+        out_f.write(_SKIPPABLE_PREFIX + struct.pack('<I', len(header) + len(manifest_bytes)))
+    out_f.write(header)
+    offset = out_f.tell()
+    out_f.write(manifest_bytes)
+    return offset
+
+
+def patch_manifest(out_f: BinaryIO, offset: int, manifest: Dict, expected_len: int) -> int:
+    """
+    Rewrite the manifest at offset (e.g. to fill in a checksum placeholder) —
+    only valid when its encoded length is unchanged. Returns the end-of-file offset.
+    """
+    manifest_bytes = json_codec.dumps(manifest)
+    if len(manifest_bytes) != expected_len:
+        raise RuntimeError("Manifest length changed while patching the checksum")
+    out_f.seek(offset)
+    out_f.write(manifest_bytes)
+    return out_f.seek(0, os.SEEK_END)
+
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("truncated package header")
+    return data
+
+
+def read_header(f: BinaryIO, magics: Container[bytes]) -> Tuple[bytes, int, Dict]:
+    """
+    Read (magic, version, manifest) from either header layout, leaving f at
+    the zstd stream. Raises ValueError if the magic is not one of magics or
+    the header is truncated or inconsistent.
+    """
+    magic = f.read(4)
+    frame_size = None
+    if magic == _SKIPPABLE_PREFIX:
+        frame_size, = struct.unpack('<I', _read_exact(f, 4))
+        magic = f.read(4)
+    if magic not in magics:
+        raise ValueError("bad magic bytes")
+    version, manifest_len = struct.unpack('>BL', _read_exact(f, 5))
+    # The skippable frame wraps exactly magic + version/length + manifest
+    if frame_size is not None and frame_size != 9 + manifest_len:
+        raise ValueError("package header frame size does not match its manifest")
+    try:
+        manifest = json_codec.loads(_read_exact(f, manifest_len))
+    except ValueError as e:
+        raise ValueError(f"corrupt package manifest: {e}") from e
+    return magic, version, manifest
+
+
+__all__ = ["write_header", "patch_manifest", "read_header", "SKIPPABLE_FRAME_MAGIC"]
@@ -0,0 +1,28 @@
+"""
+Zypher text helpers
+"""
+
+
+class _NonPrintableTable(dict):
+    """
+    str.translate table that deletes non-printable characters.
+    Entries are filled on first sight of each code point, so the table only
+    holds characters that actually occur instead of all 0x110000.
+    """
+    def __missing__(self, codepoint: int):
+        value = codepoint if chr(codepoint).isprintable() else None
+        self[codepoint] = value
+        return value
+
+
+_NONPRINTABLE = _NonPrintableTable()
+
+
+def strip_nonprintable(text: str) -> str:
+    """Remove control/format characters. str.isprintable() and translate both run in C."""
+    if text.isprintable():
+        return text
+    return text.translate(_NONPRINTABLE)
+
+
+__all__ = ["strip_nonprintable"]
@@ -0,0 +1,86 @@
+"""
+Zypher Zstd Contexts
+Shared compression/decompression contexts for the stream compressors.
+Context setup at high levels allocates large match tables, so each thread
+builds one context per parameter set and reuses it. Zstd contexts are not
+safe to share between threads, hence the thread-local cache. Dictionaries
+are digested once per parameter set (precompute_compress) instead of being
+reloaded for every frame.
+"""
+import threading
+from typing import Optional
+import zstandard as zstd
+
+_local = threading.local()
+
+
+def get_compressor(
+    level: int,
+    window_log: int = 0,
+    enable_ldm: bool = False,
+    dict_data: Optional[zstd.ZstdCompressionDict] = None,
+    ldm_hash_log: int = 0,
+    threads: int = -1
+) -> zstd.ZstdCompressor:
+    """Return this thread's compressor (multi-threaded by default) for the given parameters."""
+    cache = getattr(_local, 'compressors', None)
+    if cache is None:
+        cache = _local.compressors = {}
+
+    # Raw-content dicts all report dict_id 0, so key on the object itself;
+    # the entry keeps the dict alive so its id cannot be recycled
+    key = (level, window_log, enable_ldm, ldm_hash_log, threads, dict_data is not None, id(dict_data))
+    entry = cache.get(key)
+    cctx = entry[1] if entry is not None and entry[0] is dict_data else None
+    if cctx is None:
+        # threads=-1: zstd splits large inputs across all cores
+        params = zstd.ZstdCompressionParameters.from_level(
+            level,
+            window_log=window_log,
+            enable_ldm=int(enable_ldm),
+            ldm_hash_log=ldm_hash_log,
+            # Record the dictionary id so readers can tell which dict a frame needs
+            write_dict_id=int(dict_data is not None),
+            threads=threads
+        )
+        if dict_data is not None:
+            # A precomputed dict carries its own parameters, so each parameter
+            # set gets its own digested copy rather than mutating the caller's
+            cdict = zstd.ZstdCompressionDict(dict_data.as_bytes())
+            cdict.precompute_compress(compression_params=params)
+            cctx = zstd.ZstdCompressor(compression_params=params, dict_data=cdict)
+        else:
+            cctx = zstd.ZstdCompressor(compression_params=params)
+        cache[key] = (dict_data, cctx)
+    return cctx
+
+
+def stream_chunk_size(file_size: int, multithreaded: bool = True) -> int:
+    """Bytes to hand a stream compressor per write."""
+    # zstd's advertised input size (~128KB) lets the stream consume reads
+    # without staging them; multi-threaded jobs on big files get several
+    # windows' worth per write so every worker has a block to chew on
+    if multithreaded and file_size >= 100_000_000:
+        return zstd.COMPRESSION_RECOMMENDED_INPUT_SIZE * 64
+    return zstd.COMPRESSION_RECOMMENDED_INPUT_SIZE
+
+
+def get_decompressor(dict_data: Optional[zstd.ZstdCompressionDict] = None) -> zstd.ZstdDecompressor:
+    """Return this thread's decompressor (dictionary-aware when one is given)."""
+    cache = getattr(_local, 'decompressors', None)
+    if cache is None:
+        cache = _local.decompressors = {}
+
+    key = (dict_data is not None, id(dict_data))
+    entry = cache.get(key)
+    dctx = entry[1] if entry is not None and entry[0] is dict_data else None
+    if dctx is None:
+        if dict_data is not None:
+            dctx = zstd.ZstdDecompressor(dict_data=dict_data)
+        else:
+            dctx = zstd.ZstdDecompressor()
+        cache[key] = (dict_data, dctx)
+    return dctx
+
+
+__all__ = ["get_compressor", "get_decompressor", "stream_chunk_size"]
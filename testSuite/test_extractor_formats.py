@@ -0,0 +1,191 @@
+"""
+Extractor format paths:
+- Streamed XLSX parser: shared and inline strings, phonetic runs, number
+  formats (dates, percentages) and the 1904 date system. The workbook is
+  written by hand so the test needs no openpyxl.
+- OCR: one Tesseract engine per thread when tesserocr is available, and the
+  scanned-page fallback. The engine is a stand-in, so no tesseract install
+  is needed.
+Run from the repo root: python -m unittest discover -s testSuite
+"""
+import os
+import tempfile
+import threading
+import types
+import unittest
+import zipfile
+from unittest import mock
+
+from core.extractor import extractor as extractor_module
+from core.extractor.extractor import Extractor
+
+NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+REL_NS = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+
+RELS = (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '</Relationships>'
+)
+
+SHARED = (
+    f'<sst {NS} count="2" uniqueCount="2">'
+    '<si><t>Name</t></si>'
+    # Rich text runs plus a phonetic (furigana) run that is not cell text
+    '<si><r><t>東京</t></r><r><t>都</t></r><rPh sb="0" eb="2"><t>トウキョウ</t></rPh></si>'
+    '</sst>'
+)
+
+# xf 0 general, 1 built-in date (14), 2 built-in percent (10),
+# 3 custom percent, 4 custom date, 5 quoted literal that only looks like a date
+STYLES = (
+    f'<styleSheet {NS}>'
+    '<numFmts count="3">'
+    '<numFmt numFmtId="164" formatCode="0.0%"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd hh:mm"/>'
+    '<numFmt numFmtId="166" formatCode="0.00&quot; days&quot;"/>'
+    '</numFmts>'
+    '<cellXfs count="6">'
+    '<xf numFmtId="0"/><xf numFmtId="14"/><xf numFmtId="10"/>'
+    '<xf numFmtId="164"/><xf numFmtId="165"/><xf numFmtId="166"/>'
+    '</cellXfs>'
+    '</styleSheet>'
+)
+
+SHEET = (
+    f'<worksheet {NS}><sheetData>'
+    '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="inlineStr"><is><t>Inline</t></is></c></row>'
+    '<row r="2"><c r="A2" t="s"><v>1</v></c><c r="B2" t="b"><v>1</v></c></row>'
+    '<row r="3"><c r="A3"><v>42</v></c><c r="B3"><v>2.5</v></c></row>'
+    '<row r="4"><c r="A4" s="1"><v>45292</v></c><c r="B4" s="4"><v>45292.5</v></c></row>'
+    '<row r="5"><c r="A5" s="2"><v>0.125</v></c><c r="B5" s="3"><v>0.5</v></c></row>'
+    '<row r="6"><c r="A6" s="5"><v>3</v></c><c r="B6" s="1"><v>0.75</v></c></row>'
+    '<row r="7"><c r="A7" t="str"><v>formula text</v></c><c r="B7"/></row>'
+    '</sheetData></worksheet>'
+)
+
+
+def _workbook(date1904: bool) -> str:
+    pr = '<workbookPr date1904="1"/>' if date1904 else ''
+    return (
+        f'<workbook {NS} {REL_NS}>{pr}'
+        '<sheets><sheet name="Data" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+class TestStreamedXlsx(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.extractor = Extractor(use_cache=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, date1904: bool = False) -> str:
+        path = os.path.join(self.tmp.name, 'book.xlsx')
+        with zipfile.ZipFile(path, 'w') as zf:
+            zf.writestr('xl/workbook.xml', _workbook(date1904))
+            zf.writestr('xl/_rels/workbook.xml.rels', RELS)
+            zf.writestr('xl/sharedStrings.xml', SHARED)
+            zf.writestr('xl/styles.xml', STYLES)
+            zf.writestr('xl/worksheets/sheet1.xml', SHEET)
+        return path
+
+    def _rows(self, path: str) -> list:
+        pages = list(self.extractor._stream_xlsx(path))
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(pages[0]['sheet'], 'Data')
+        return [row.split('\t') for row in pages[0]['text'].split('\n')]
+
+    def test_cells(self):
+        self.assertEqual(self._rows(self._write()), [
+            ['Name', 'Inline'],
+            ['東京都', 'True'],
+            ['42', '2.5'],
+            ['2024-01-01 00:00:00', '2024-01-01 12:00:00'],
+            ['12.5%', '50%'],
+            ['3', '18:00:00'],
+            ['formula text'],
+        ])
+
+    def test_1904_date_system(self):
+        rows = self._rows(self._write(date1904=True))
+        # Same serials, 1462 days later
+        self.assertEqual(rows[3], ['2028-01-02 00:00:00', '2028-01-02 12:00:00'])
+
+    def test_not_a_zip(self):
+        path = os.path.join(self.tmp.name, 'broken.xlsx')
+        with open(path, 'wb') as f:
+            f.write(b'not a zip')
+        with self.assertRaises(ValueError):
+            list(self.extractor._stream_xlsx(path))
+
+
+class _FakeTessAPI:
+    """Stands in for tesserocr.PyTessBaseAPI and counts engine start-ups."""
+    created = 0
+
+    def __init__(self):
+        type(self).created += 1
+        self.image = None
+
+    def SetImage(self, img):
+        self.image = img
+
+    def GetUTF8Text(self):
+        return f" page {self.image.size[0]}x{self.image.size[1]} \n"
+
+
+@unittest.skipUnless(extractor_module.HAS_PIL, "Pillow not installed")
+class TestOcr(unittest.TestCase):
+    def setUp(self):
+        _FakeTessAPI.created = 0
+        fake = types.SimpleNamespace(PyTessBaseAPI=_FakeTessAPI)
+        patches = [
+            mock.patch.object(extractor_module, 'HAS_TESSEROCR', True),
+            mock.patch.object(extractor_module, 'HAS_OCR', True),
+            mock.patch.object(extractor_module, '_tess_local', threading.local()),
+            mock.patch.dict(extractor_module._modules, {'tesserocr': fake}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _image(self, size=(40, 20)):
+        return extractor_module._lazy('PIL.Image').new('L', size, 255)
+
+    def test_engine_reused_per_thread(self):
+        self.assertEqual(extractor_module._ocr_image(self._image()), 'page 40x20')
+        self.assertEqual(extractor_module._ocr_image(self._image((8, 8))), 'page 8x8')
+        self.assertEqual(_FakeTessAPI.created, 1)
+
+        other = threading.Thread(target=extractor_module._ocr_image, args=(self._image(),))
+        other.start()
+        other.join()
+        self.assertEqual(_FakeTessAPI.created, 2)
+
+    def test_pytesseract_fallback(self):
+        fake = types.SimpleNamespace(image_to_string=lambda img: ' via subprocess \n')
+        with mock.patch.object(extractor_module, 'HAS_TESSEROCR', False), \
+                mock.patch.dict(extractor_module._modules, {'pytesseract': fake}):
+            self.assertEqual(extractor_module._ocr_image(self._image()), 'via subprocess')
+        self.assertEqual(_FakeTessAPI.created, 0)
+
+    @unittest.skipUnless(extractor_module.HAS_FITZ, "PyMuPDF not installed")
+    def test_scanned_pdf_page(self):
+        fitz = extractor_module._lazy('fitz')
+        doc = fitz.open()
+        doc.new_page(width=72, height=36)  # blank: no text layer
+        try:
+            page = extractor_module._extract_pdf_page_text(doc, 0)
+        finally:
+            doc.close()
+        # 1in x 0.5in at OCR_DPI, rendered grayscale
+        side = extractor_module.OCR_DPI
+        self.assertEqual(page, {'page_num': 1, 'text': f'page {side}x{side // 2}', 'scanned': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+MetadataCompressor payload format: JSON vs tagged MessagePack, and legacy
+v1 chunks the rebuilder still has to read.
+Run from the repo root: python -m unittest discover -s testSuite
+"""
+import io
+import json
+import unittest
+import zstandard as zstd
+
+from core.compressor.metadata_compressor import MetadataCompressor, HAS_MSGPACK
+from core.rebuilder.pdf_rebuilder import PDFRebuilder
+
+NO_DICT = '/nonexistent/layout.dict'
+
+# Every JSON top-level type, including the ones whose first byte collides
+# with a msgpack fixint/fixstr
+PAYLOADS = ["a string", 34, -1.5, True, None, [1, 2], {"pages": {"1": {"lines": [[38, 1]]}}}]
+
+
+class TestPayloadFormat(unittest.TestCase):
+    def _round_trip(self, mc):
+        for data in PAYLOADS:
+            with self.subTest(data=data):
+                self.assertEqual(mc.decompress(mc.compress(data)), data)
+
+    def test_json_round_trip(self):
+        self._round_trip(MetadataCompressor(legacy_json=True, dict_path=NO_DICT))
+
+    @unittest.skipUnless(HAS_MSGPACK, "msgpack not installed")
+    def test_msgpack_round_trip(self):
+        self._round_trip(MetadataCompressor(dict_path=NO_DICT))
+
+    def test_untagged_json_from_baseline(self):
+        # Pre-msgpack archives hold bare zstd(JSON) with any top-level type
+        mc = MetadataCompressor(dict_path=NO_DICT)
+        for data in PAYLOADS:
+            with self.subTest(data=data):
+                frame = zstd.ZstdCompressor().compress(json.dumps(data).encode('utf-8'))
+                self.assertEqual(mc.decompress(frame), data)
+
+    def test_leading_whitespace_is_json(self):
+        mc = MetadataCompressor(dict_path=NO_DICT)
+        frame = zstd.ZstdCompressor().compress(b' \n{"a": 1}')
+        self.assertEqual(mc.decompress(frame), {"a": 1})
+
+    def test_compress_to_matches_compress(self):
+        mc = MetadataCompressor(dict_path=NO_DICT)
+        layout = {"fonts": ["Helvetica"], "pages": {"1": {"lines": [[38, 1]]}, "2": {"lines": []}}}
+        out = io.BytesIO()
+        mc.compress_to(layout, out)
+        out.seek(0)
+        self.assertEqual(mc.decompress_from(out), layout)
+
+
+class TestLegacyFontChunk(unittest.TestCase):
+    FONTS = {"ABCDEF+Demo": b"\x00\x01font-program\xff"}
+
+    def test_v1_string_payload(self):
+        # packagerV1 wrote meta_comp.compress(json.dumps({...})) — a JSON
+        # string holding the hex font map, serialized again as JSON
+        inner = json.dumps({name: data.hex() for name, data in self.FONTS.items()})
+        frame = zstd.ZstdCompressor().compress(json.dumps(inner).encode('utf-8'))
+
+        fonts = PDFRebuilder()._load_fonts([{'type': 'fonts', 'data': frame}])
+        self.assertEqual(fonts["ABCDEF+Demo"], self.FONTS["ABCDEF+Demo"])
+        # Subset prefix is stripped into an alias
+        self.assertEqual(fonts["Demo"], self.FONTS["ABCDEF+Demo"])
+
+    def test_uncompressed_chunk(self):
+        raw = json.dumps({name: data.hex() for name, data in self.FONTS.items()}).encode('utf-8')
+        fonts = PDFRebuilder()._load_fonts([{'type': 'fonts', 'data': raw}])
+        self.assertEqual(fonts["ABCDEF+Demo"], self.FONTS["ABCDEF+Demo"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Package header layouts: v1 (bare MAGIC + manifest) and v2 (wrapped in a zstd
+skippable frame), manifest patching, and rejection of damaged headers.
+Run from the repo root: python -m unittest discover -s testSuite
+"""
+import io
+import os
+import struct
+import tempfile
+import unittest
+import zstandard as zstd
+
+from core.utils import json_codec
+from core.utils.package_header import write_header, patch_manifest, read_header, SKIPPABLE_FRAME_MAGIC
+
+MAGICS = {b'ZPKG', b'ZPKV'}
+MANIFEST = {'original_filename': 'a.txt', 'original_size': 5, 'checksum': '0' * 16}
+
+
+def _package(skippable: bool, payload: bytes = b'hello') -> io.BytesIO:
+    f = io.BytesIO()
+    write_header(f, b'ZPKG', 2 if skippable else 1, json_codec.dumps(MANIFEST), skippable=skippable)
+    f.write(zstd.ZstdCompressor().compress(payload))
+    f.seek(0)
+    return f
+
+
+class TestPackageHeader(unittest.TestCase):
+    def test_v1_round_trip(self):
+        f = _package(skippable=False)
+        self.assertEqual(read_header(f, MAGICS), (b'ZPKG', 1, MANIFEST))
+        self.assertEqual(zstd.ZstdDecompressor().stream_reader(f).read(), b'hello')
+
+    def test_v2_round_trip(self):
+        f = _package(skippable=True)
+        self.assertEqual(f.getvalue()[:4], struct.pack('<I', SKIPPABLE_FRAME_MAGIC))
+        self.assertEqual(read_header(f, MAGICS), (b'ZPKG', 2, MANIFEST))
+        self.assertEqual(zstd.ZstdDecompressor().stream_reader(f).read(), b'hello')
+
+    def test_v2_is_a_plain_zstd_stream(self):
+        # A generic zstd reader skips the header frame and restores the file
+        f = _package(skippable=True)
+        reader = zstd.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+        self.assertEqual(reader.read(), b'hello')
+
+    def test_patch_manifest_in_place(self):
+        manifest_bytes = json_codec.dumps(MANIFEST)
+        with tempfile.TemporaryFile() as f:
+            offset = write_header(f, b'ZPKG', 2, manifest_bytes, skippable=True)
+            f.write(zstd.ZstdCompressor().compress(b'hello'))
+            patched = dict(MANIFEST, checksum='f' * 16)
+            end = patch_manifest(f, offset, patched, len(manifest_bytes))
+            self.assertEqual(end, f.seek(0, os.SEEK_END))
+            f.seek(0)
+            self.assertEqual(read_header(f, MAGICS)[2], patched)
+
+    def test_patch_manifest_rejects_length_change(self):
+        manifest_bytes = json_codec.dumps(MANIFEST)
+        f = io.BytesIO()
+        offset = write_header(f, b'ZPKG', 2, manifest_bytes, skippable=True)
+        with self.assertRaises(RuntimeError):
+            patch_manifest(f, offset, dict(MANIFEST, checksum='f' * 32), len(manifest_bytes))
+
+
+class TestCorruptHeader(unittest.TestCase):
+    def _assert_rejected(self, data: bytes):
+        with self.assertRaises(ValueError):
+            read_header(io.BytesIO(data), MAGICS)
+
+    def test_bad_magic(self):
+        data = bytearray(_package(skippable=False).getvalue())
+        data[:4] = b'NOPE'
+        self._assert_rejected(bytes(data))
+
+    def test_bad_inner_magic(self):
+        data = bytearray(_package(skippable=True).getvalue())
+        data[8:12] = b'NOPE'
+        self._assert_rejected(bytes(data))
+
+    def test_truncated(self):
+        data = _package(skippable=True).getvalue()
+        for size in (0, 6, 10, 14, 20):
+            with self.subTest(size=size):
+                self._assert_rejected(data[:size])
+
+    def test_frame_size_mismatch(self):
+        data = bytearray(_package(skippable=True).getvalue())
+        frame_size, = struct.unpack('<I', data[4:8])
+        data[4:8] = struct.pack('<I', frame_size + 1)
+        self._assert_rejected(bytes(data))
+
+    def test_garbled_manifest(self):
+        data = bytearray(_package(skippable=True).getvalue())
+        data[17] ^= 0xFF  # first manifest byte
+        self._assert_rejected(bytes(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+TextCompressor payload tags: raw below RAW_THRESHOLD, zstd from it up, and
+untagged frames written before the tags existed.
+Run from the repo root: python -m unittest discover -s testSuite
+"""
+import unittest
+import zstandard as zstd
+
+from core.compressor.text_compressor import TextCompressor, RAW_THRESHOLD, TAG_RAW, TAG_ZSTD
+
+
+class TestTextCompressorTags(unittest.TestCase):
+    def setUp(self):
+        self.tc = TextCompressor()
+
+    def test_below_threshold_is_raw(self):
+        text = 'x' * (RAW_THRESHOLD - 1)
+        data = self.tc.compress(text)
+        self.assertEqual(data, TAG_RAW + text.encode('utf-8'))
+        self.assertEqual(self.tc.decompress(data), text)
+
+    def test_at_threshold_is_zstd(self):
+        text = 'x' * RAW_THRESHOLD
+        data = self.tc.compress(text)
+        self.assertEqual(data[:1], TAG_ZSTD)
+        self.assertEqual(self.tc.decompress(data), text)
+
+    def test_threshold_counts_utf8_bytes(self):
+        # 64 two-byte characters: 64 chars but RAW_THRESHOLD encoded bytes
+        text = 'é' * (RAW_THRESHOLD // 2)
+        self.assertEqual(self.tc.compress(text)[:1], TAG_ZSTD)
+        self.assertEqual(self.tc.decompress(self.tc.compress(text)), text)
+
+    def test_round_trip_sizes(self):
+        for size in (0, 1, RAW_THRESHOLD - 1, RAW_THRESHOLD, RAW_THRESHOLD + 1, 5000, 200_000):
+            with self.subTest(size=size):
+                text = ('zypher ' * (size // 7 + 1))[:size]
+                self.assertEqual(self.tc.decompress(self.tc.compress(text)), text)
+
+    def test_bytes_input(self):
+        self.assertEqual(self.tc.decompress(self.tc.compress(b'short')), 'short')
+
+    def test_untagged_legacy_frame(self):
+        text = 'legacy payload ' * 20
+        frame = zstd.ZstdCompressor().compress(text.encode('utf-8'))
+        self.assertEqual(self.tc.decompress(frame), text)
+
+
+if __name__ == '__main__':
+    unittest.main()